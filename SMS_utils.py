@@ -1,11 +1,16 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from collections import defaultdict
 from database import get_connection
 from auth import get_user_id
-from dateutil.relativedelta import relativedelta
+from rollover import roll_over_deadlines
+from rate_limiter import RateLimiter
+from delivery_log import DeliveryRecorder
 from dotenv import load_dotenv
-from twilio.rest import Client
 
 # Load .env variables
 load_dotenv()
@@ -14,46 +19,178 @@ load_dotenv()
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Point at a local fake to exercise the dispatcher without sending real SMS
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "https://api.twilio.com").rstrip("/")
+
+# Concurrent dispatch: worker threads sharing one HTTP connection pool, and the
+# global send rate (Twilio queues 1 msg/s per long code, more for short codes)
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", "4"))
+SMS_RATE_PER_SEC = float(os.getenv("SMS_RATE_PER_SEC", "1"))
+SMS_TIMEOUT = float(os.getenv("SMS_TIMEOUT", "10"))
+# Retries of sends Twilio provably did not process (connection never opened, 429, 503),
+# with jittered exponential backoff (seconds)
+SMS_MAX_RETRIES = int(os.getenv("SMS_MAX_RETRIES", "3"))
+SMS_RETRY_BASE_DELAY = float(os.getenv("SMS_RETRY_BASE_DELAY", "1"))
+SMS_RETRY_MAX_DELAY = float(os.getenv("SMS_RETRY_MAX_DELAY", "30"))
+
+# Creating a message is not idempotent: other 5xx replies may come after Twilio accepted it
+SMS_RETRY_STATUSES = {429, 503}
+
+class SMSError(Exception):
+    """A failed send; retryable is False when Twilio may have sent the SMS anyway."""
+
+    def __init__(self, message, status=None, retryable=True):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """HTTP session shared by every sender thread, keeping connections to Twilio alive."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, SMS_WORKERS))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def _retry_delay(attempt, retry_after=None):
+    """Full-jitter backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(SMS_RETRY_MAX_DELAY, SMS_RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+def _never_sent(error):
+    """True when a requests error happened before the POST could reach Twilio.
+
+    ConnectionError also wraps a connection aborted after the request went
+    out on a reused keep-alive connection, so only connect timeouts and
+    failures to open a new connection count.
+    """
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+def deliver_sms(to_phone, message, max_retries=SMS_MAX_RETRIES, limiter=None):
+    """Send one SMS through the Twilio REST API and return its SID.
+
+    Only failures where the request provably was not processed (connect
+    timeouts, new connections that could not be opened, 429 and 503 replies)
+    are retried, up to max_retries times. Any other failure raises SMSError
+    at once; after an aborted connection, a read timeout or another 5xx
+    reply the SMS may have gone out, so that error is not retryable.
+    Every attempt, retries included, takes a token from limiter when one is
+    given.
+    """
+    import requests
+    url = f"{TWILIO_API_BASE}/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+    data = {"To": to_phone, "From": TWILIO_PHONE_NUMBER, "Body": message}
+    attempt = 0
+    while True:
+        retry_after = None
+        if limiter:
+            limiter.acquire()
+        try:
+            response = get_http_session().post(url, data=data, timeout=SMS_TIMEOUT)
+        except requests.RequestException as e:
+            if not _never_sent(e):
+                raise SMSError(f"Twilio reply lost, the SMS may have been sent: {e}", retryable=False)
+            error = SMSError(f"Twilio unreachable: {e}")
+        else:
+            if response.status_code < 300:
+                return response.json()["sid"]
+            try:
+                detail = response.json().get("message", response.text)
+            except ValueError:
+                detail = response.text
+            error = SMSError(f"Twilio {response.status_code}: {detail}", response.status_code,
+                             retryable=response.status_code < 500 or response.status_code in SMS_RETRY_STATUSES)
+            if response.status_code not in SMS_RETRY_STATUSES:
+                raise error
+            retry_after = response.headers.get("Retry-After")
+        if attempt >= max_retries:
+            raise error
+        time.sleep(_retry_delay(attempt, retry_after))
+        attempt += 1
+
+def dispatch_sms(messages, workers=SMS_WORKERS, rate=SMS_RATE_PER_SEC):
+    """Send messages ({"to", "message", ...}) in parallel under a global rate limit.
+
+    Returns (message, error) pairs in input order, error being None when the
+    SMS was accepted; the SID is then stored in message["sid"].
+    """
+    # No burst: the provider's cap is per second, not per average
+    limiter = RateLimiter(rate, burst=1)
+
+    def send_one(msg):
+        try:
+            msg["sid"] = deliver_sms(msg["to"], msg["message"], limiter=limiter)
+            return msg, None
+        except Exception as e:
+            return msg, e
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(send_one, messages))
+
+    elapsed = time.monotonic() - started
+    sent = sum(1 for _, error in results if error is None)
+    if results:
+        print(f"📱 {sent}/{len(results)} SMS en {elapsed:.1f}s ({sent / elapsed if elapsed else 0.0:.2f} msg/s)")
+    return results
+
+def normalize_phone(phone):
+    phone = (phone or "").strip()
+    if phone.startswith("0"):
+        phone = "+212" + phone[1:]
+    return phone if phone.startswith("+") else None
 
 def send_sms(to_phone, message):
     try:
-        sms = client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_phone
-        )
-        print(f"✅ SMS sent to {to_phone}: {sms.sid}")
+        sid = deliver_sms(to_phone, message)
+        print(f"✅ SMS sent to {to_phone}: {sid}")
+        return sid
     except Exception as e:
         print(f"❌ Failed to send SMS to {to_phone}: {e}")
 
 def send_reminders(days_list=[1], username=None):
     user_id = get_user_id(username) if username else None
 
-    # Reset SMS status
     conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE deadlines SET email_sent = FALSE WHERE email_sent = TRUE")
-    conn.commit()
-    conn.close()
 
+    messages = []
     for days_before in days_list:
-        conn = get_connection()
-        if not conn:
-            print("❌ Failed to connect to the database.")
-            return
-        c = conn.cursor()
-
-        reminder_date = (datetime.now() + timedelta(days=days_before)).strftime("%Y-%m-%d")
+        reminder_date = (datetime.now() + timedelta(days=days_before)).date()
 
+        # Deadlines whose SMS for this offset is already in the ledger are skipped
         query = """
-        SELECT c.name, c.phone, d.type, d.period, d.due_date
+        SELECT c.user_id, d.id, c.phone, d.type, d.period, d.due_date
         FROM deadlines d
         JOIN clients c ON d.client_id = c.id
         WHERE d.status = 'Pending' AND d.due_date = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM delivery_ledger l
+              WHERE l.deadline_id = d.id AND l.occurrence_date = d.due_date
+                AND l.offset_days = %s AND l.channel = 'sms'
+          )
         """
-        params = (reminder_date,)
+        params = (reminder_date, days_before)
 
         if user_id:
             query += " AND c.user_id = %s"
@@ -62,78 +199,56 @@ def send_reminders(days_list=[1], username=None):
         query += " ORDER BY d.due_date ASC"
         c.execute(query, params)
         rows = c.fetchall()
-        conn.close()
 
         if not rows:
             print(f"ℹ️ No deadlines for {days_before} days before.")
             continue
 
-        client_deadlines = defaultdict(list)
-        for name, phone, task_type, period, due_date in rows:
-            client_deadlines[phone].append(
-                f"{task_type} ({period}) - échéance le {due_date}"
-            )
+        client_deadlines = defaultdict(lambda: {"deadline_ids": [], "tasks": []})
+        for owner_id, deadline_id, phone, task_type, period, due_date in rows:
+            entry = client_deadlines[phone]
+            entry["user_id"] = owner_id
+            entry["deadline_ids"].append(deadline_id)
+            entry["tasks"].append(f"{task_type} ({period}) - échéance le {due_date}")
 
-        for phone, tasks in client_deadlines.items():
-            if phone.startswith("0"):
-                phone = "+212" + phone[1:]
-            if not phone or not phone.startswith("+"):
+        for phone, entry in client_deadlines.items():
+            to_phone = normalize_phone(phone)
+            if not to_phone:
                 print(f"⚠️ Skipping invalid phone: {phone}")
                 continue
 
-            message = (
-                f"📅 Bonjour,\n"
-                f"Il reste {days_before} jour(s) avant:\n" +
-                "\n".join(tasks) +
-                "\n\nMerci de prendre les mesures nécessaires."
-            )
-
-            send_sms(phone, message)
-
-            # Mark as sent
-            conn = get_connection()
-            c = conn.cursor()
-            c.execute("""
-                UPDATE deadlines 
-                SET email_sent = TRUE 
-                WHERE status = 'Pending' AND due_date = %s AND client_id = (
-                    SELECT id FROM clients WHERE phone = %s LIMIT 1
-                )
-            """, (reminder_date, phone))
-            conn.commit()
-            conn.close()
+            messages.append({
+                "to": to_phone,
+                "message": (
+                    f"📅 Bonjour,\n"
+                    f"Il reste {days_before} jour(s) avant:\n" +
+                    "\n".join(entry["tasks"]) +
+                    "\n\nMerci de prendre les mesures nécessaires."
+                ),
+                "user_id": entry["user_id"],
+                "deadline_ids": entry["deadline_ids"],
+                "occurrence_date": reminder_date,
+                "days_before": days_before,
+            })
+    conn.close()
 
-def process_today_deadlines():
-    conn = get_connection()
-    c = conn.cursor()
-    today = datetime.now().date()
-    today_str = today.strftime("%Y-%m-%d")
-    c.execute("""
-        SELECT id, period, due_date
-        FROM deadlines
-        WHERE due_date = %s
-    """, (today_str,))
-    deadlines = c.fetchall()
-
-    for deadline_id, period, due_date in deadlines:
-        if isinstance(due_date, str):
-            due_date = datetime.strptime(due_date, "%Y-%m-%d").date()
-
-        if period.lower() == "mensuel":
-            new_due = due_date + relativedelta(months=1)
-        elif period.lower() == "trimestriel":
-            new_due = due_date + relativedelta(months=3)
-        elif period.lower() == "annuel":
-            new_due = due_date + relativedelta(years=1)
-        else:  # One time
-            c.execute("DELETE FROM deadlines WHERE id = %s", (deadline_id,))
-            continue
+    results = dispatch_sms(messages)
 
-        c.execute("UPDATE deadlines SET due_date = %s WHERE id = %s",
-                  (new_due.strftime("%Y-%m-%d"), deadline_id))
+    with DeliveryRecorder() as recorder:
+        for msg, error in results:
+            if error is None:
+                print(f"✅ SMS sent to {msg['to']}: {msg['sid']}")
+                recorder.record_sms(msg["user_id"], msg["deadline_ids"], msg["to"], msg["message"],
+                                    msg["occurrence_date"], msg["days_before"])
+            else:
+                print(f"❌ Failed to send SMS to {msg['to']}: {error}")
+    return results
 
-    conn.commit()
-    conn.close()
+def process_today_deadlines():
+    result = roll_over_deadlines()
+    moved = ", ".join(f"{period}: {count}" for period, count in result["moved"].items())
+    print(f"🔁 Échéances reportées ({moved}), {result['deleted']} échéance(s) ponctuelle(s) supprimée(s)")
+    return result
 
 if __name__ == "__main__":
     send_reminders(days_list=[20, 10, 5, 1])
@@ -1,11 +1,45 @@
 import streamlit as st
+import math
 from database import (
-    get_all_users, get_clients_by_user_id, get_deadlines_by_client_id,
-    delete_user, delete_client, delete_deadline, get_connection
+    search_users, get_client_summaries, get_deadlines_by_client_id, get_user_choices,
+    approve_users, delete_users, delete_clients, delete_deadlines, reassign_clients, get_connection,
+    bump_data_version
 )
 from datetime import datetime
-from email_utils import send_email
-from SMS_utils import send_sms
+from outbox import enqueue_messages
+from auth import invalidate_identity
+
+ADMIN_PAGE_SIZES = [10, 20, 50]
+
+def approval_messages(users):
+    messages = []
+    for user_id, username, name, email, phone in users:
+        subject = "Confirmation : votre compte a été approuvé ✅"
+        message = (f"Bonjour {username},\n\n"
+                    "Votre compte a été approuvé. Vous pouvez maintenant vous connecter et profiter de nos services.\n"
+
+                    "Bienvenue parmi nous !\n"
+
+                    "Cordialement,\n"
+                    "L’équipe\n\n"
+                    "Si vous avez des questions, n’hésitez pas à nous contacter:\n"
+                    "Email:example@gmail.com\n"
+                    "Téléphone: +212 6 37 15 33 78\n"
+                    "Site web: www.example.com")
+        messages.append({"channel": "email", "recipient": email, "subject": subject, "body": message, "user_id": user_id})
+        if phone:
+            if phone.startswith("0"):
+                phone = "+212" + phone[1:]
+            messages.append({"channel": "sms", "recipient": phone, "body": message, "user_id": user_id})
+    return messages
+
+def approve_and_notify(user_ids, approved_by):
+    # Approval and its email/SMS notifications commit together; outbox_sender.py delivers them
+    with get_connection() as conn:
+        approved = approve_users(user_ids, approved_by, conn=conn)
+        enqueue_messages(approval_messages(approved), conn=conn)
+    invalidate_identity(*[user[1] for user in approved])
+    return approved
 
 def show_admin_panel():
     st.title("👑 Admin Dashboard")
@@ -18,6 +52,14 @@ def show_admin_panel():
 
     if pending_users:
         st.subheader("⏳ Utilisateurs en attente d'approbation")
+        with st.form("bulk_approve_form"):
+            pending_labels = {f"{user[2]} ({user[1]}) — {user[3]}": user[0] for user in pending_users}
+            selected = st.multiselect("Comptes à approuver", list(pending_labels))
+            if st.form_submit_button("✅ Approuver la sélection") and selected:
+                approved = approve_and_notify([pending_labels[label] for label in selected], st.session_state["username"])
+                st.success(f"{len(approved)} utilisateur(s) approuvé(s), confirmations mises en file d'envoi.")
+                st.rerun()
+
         for user in pending_users:
             with st.expander(f"🆕 {user[2]} ({user[1]}) — {user[3]}"):
                 st.write("Ce compte est en attente d'approbation.")
@@ -27,85 +69,133 @@ def show_admin_panel():
                 else:
                     st.write("📅 Inscrit le : inconnu")
                 if st.button(f"✅ Approuver {user[1]}", key=f"approve_{user[0]}"):
-                    conn = get_connection()
-                    c = conn.cursor()
-                    c.execute("""UPDATE users SET approved = TRUE, approved_by = %s, approved_at = CURRENT_TIMESTAMP WHERE id = %s""", (st.session_state["username"], user[0]))
-                    conn.commit()
-                    conn.close()
+                    approve_and_notify([user[0]], st.session_state["username"])
                     st.success(f"L'utilisateur {user[1]} a été approuvé.")
-                    subject = "Confirmation : votre compte a été approuvé ✅"
-                    message = (f"Bonjour {user[1]},\n\n"
-                                "Votre compte a été approuvé. Vous pouvez maintenant vous connecter et profiter de nos services.\n"
-
-                                "Bienvenue parmi nous !\n"
-
-                                "Cordialement,\n"
-                                "L’équipe\n\n"
-                                "Si vous avez des questions, n’hésitez pas à nous contacter:\n"
-                                "Email:example@gmail.com\n"
-                                "Téléphone: +212 6 37 15 33 78\n"
-                                "Site web: www.example.com")
-                    phone = user[4]
-                    if phone.startswith("0"):
-                        phone = "+212" + phone[1:]
-                    send_email(user[3], subject, message)
-                    st.success("✅ Email de confirmation envoyé.")
-                    send_sms(phone, message)
-                    st.success("✅ SMS de confirmation envoyé.")
                     st.rerun()
     else:
         st.info("✅ Aucun utilisateur en attente.")
 
-    users = get_all_users()
+    st.subheader("👥 Utilisateurs approuvés")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search = st.text_input("🔍 Rechercher (nom, identifiant, email)", key="admin_user_search",
+                               on_change=lambda: st.session_state.update(admin_user_page=1))
+    with col2:
+        page_size = st.selectbox("Par page", ADMIN_PAGE_SIZES, key="admin_page_size",
+                                 on_change=lambda: st.session_state.update(admin_user_page=1))
+    page = st.session_state.get("admin_user_page", 1)
+
+    users, total = search_users(search, limit=page_size, offset=(page - 1) * page_size)
+    pages = max(1, math.ceil(total / page_size))
+    if not users and page > 1:
+        st.session_state["admin_user_page"] = pages
+        st.rerun()
     if not users:
         st.warning("No users found.")
         return
 
+    with st.expander("🧰 Actions groupées"):
+        with st.form("bulk_delete_users_form"):
+            user_labels = {f"{user['name']} ({user['username']})": user['id'] for user in users}
+            selected = st.multiselect("Utilisateurs à supprimer (page courante)", list(user_labels))
+            confirm = st.checkbox("Supprimer aussi toutes leurs données")
+            if st.form_submit_button("❌ Supprimer la sélection") and selected and confirm:
+                usernames = delete_users([user_labels[label] for label in selected])
+                invalidate_identity(*usernames)
+                bump_data_version(*user_labels.values())
+                st.success(f"{len(usernames)} utilisateur(s) supprimé(s).")
+                st.rerun()
+
+        if st.toggle("🔀 Réassigner des clients", key="admin_reassign"):
+            show_client_reassignment()
+
     for user in users:
-        if user.get('approved') != True:
-            continue
-        with st.expander(f"👤 {user['name']} ({user['username']}) — {user['email']}"):
+        with st.expander(
+            f"👤 {user['name']} ({user['username']}) — {user['email']} · "
+            f"{user['client_count']} clients, {user['deadline_count']} échéances ({user['pending_count']} en attente)"
+        ):
             # Delete User Form
             with st.form(f"delete_user_form_{user['id']}"):
                 st.write("🗑️ Delete this user and all their data?")
                 delete_user_submit = st.form_submit_button(f"❌ Delete User ID {user['id']}")
                 if delete_user_submit:
-                    delete_user(user['id'])
+                    invalidate_identity(*delete_users([user['id']]))
+                    bump_data_version(user['id'])
                     st.success("User deleted.")
                     st.rerun()
 
-            clients = get_clients_by_user_id(user['id'])
-            if not clients:
+            # Clients are only loaded for the users the admin opens
+            if not user['client_count']:
                 st.info("No clients for this user.")
-            else:
-                for client in clients:
-                    with st.expander(f"📂 Client: {client['name']} (ICE: {client['ice']})"):
-                        # Delete Client Form
-                        with st.form(f"delete_client_form_{client['id']}"):
-                            st.write("🗑️ Delete this client and their deadlines?")
-                            delete_client_submit = st.form_submit_button(f"❌ Delete Client ID {client['id']}")
-                            if delete_client_submit:
-                                delete_client(client['id'])
-                                st.success("Client deleted.")
-                                st.rerun()
-
-                        deadlines = get_deadlines_by_client_id(client['id'])
-                        if not deadlines:
-                            st.info("No deadlines.")
-                        else:
-                            for deadline in deadlines:
-                                with st.expander(f"📌 Deadline ID {deadline['id']} — {deadline['type']} due {deadline['due_date']}"):
-                                    st.markdown(f"""
-                                    🗓 **Type:** {deadline['type']}  
-                                    🔁 **Period:** {deadline['period']}  
-                                    ⏰ **Due Date:** {deadline['due_date']}  
-                                    📤 **Email Sent:** {'✅' if deadline['email_sent'] else '❌'}
-                                    """)
-
-                                    # Delete Deadline Form
-                                    with st.form(f"delete_deadline_form_{deadline['id']}"):
-                                        delete_dl_submit = st.form_submit_button(f"❌ Delete Deadline ID {deadline['id']}")
-                                        if delete_dl_submit:
-                                            delete_deadline(deadline['id'])
-                                            st.success("Deadline deleted.")
-                                            st.rerun()
+            elif st.toggle("📂 Afficher les clients", key=f"show_clients_{user['id']}"):
+                show_user_clients(user['id'])
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ Précédent", disabled=page <= 1, key="admin_prev_page"):
+            st.session_state["admin_user_page"] = page - 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page} / {pages} — {total} utilisateur(s)")
+    with col3:
+        if st.button("Suivant ▶", disabled=page >= pages, key="admin_next_page"):
+            st.session_state["admin_user_page"] = page + 1
+            st.rerun()
+
+def show_client_reassignment():
+    choices = {f"{name} ({username})": user_id for user_id, username, name in get_user_choices()}
+    if len(choices) < 2:
+        st.info("Il faut au moins deux utilisateurs approuvés.")
+        return
+    source = st.selectbox("Depuis l'utilisateur", list(choices), key="reassign_source")
+    clients = get_client_summaries(choices[source])
+    with st.form("bulk_reassign_form"):
+        client_labels = {f"{client['name']} (ID {client['id']})": client['id'] for client in clients}
+        selected = st.multiselect("Clients à réassigner", list(client_labels))
+        target = st.selectbox("Vers l'utilisateur", [label for label in choices if label != source])
+        if st.form_submit_button("🔀 Réassigner la sélection") and selected:
+            moved = reassign_clients([client_labels[label] for label in selected], choices[target])
+            bump_data_version(choices[source], choices[target])
+            st.success(f"{moved} client(s) réassigné(s) à {target}.")
+            st.rerun()
+
+def show_user_clients(user_id):
+    clients = get_client_summaries(user_id)
+    with st.form(f"delete_clients_form_{user_id}"):
+        client_labels = {f"{client['name']} (ID {client['id']})": client['id'] for client in clients}
+        selected = st.multiselect("🗑️ Clients à supprimer, avec leurs échéances", list(client_labels))
+        if st.form_submit_button("❌ Supprimer les clients sélectionnés") and selected:
+            deleted = delete_clients([client_labels[label] for label in selected])
+            bump_data_version(user_id)
+            st.success(f"{deleted} client(s) supprimé(s).")
+            st.rerun()
+
+    for client in clients:
+        with st.expander(
+            f"📂 Client: {client['name']} (ICE: {client['ice']}) — "
+            f"{client['deadline_count']} échéances ({client['pending_count']} en attente)"
+        ):
+            if not client['deadline_count']:
+                st.info("No deadlines.")
+            elif st.toggle("📌 Afficher les échéances", key=f"show_deadlines_{client['id']}"):
+                deadlines = get_deadlines_by_client_id(client['id'])
+                with st.form(f"delete_deadlines_form_{client['id']}"):
+                    deadline_labels = {
+                        f"ID {deadline['id']} — {deadline['type']} due {deadline['due_date']}": deadline['id']
+                        for deadline in deadlines
+                    }
+                    selected = st.multiselect("🗑️ Échéances à supprimer", list(deadline_labels))
+                    if st.form_submit_button("❌ Supprimer les échéances sélectionnées") and selected:
+                        deleted = delete_deadlines([deadline_labels[label] for label in selected])
+                        bump_data_version(user_id)
+                        st.success(f"{deleted} échéance(s) supprimée(s).")
+                        st.rerun()
+
+                for deadline in deadlines:
+                    with st.expander(f"📌 Deadline ID {deadline['id']} — {deadline['type']} due {deadline['due_date']}"):
+                        st.markdown(f"""
+                        🗓 **Type:** {deadline['type']}  
+                        🔁 **Period:** {deadline['period']}  
+                        ⏰ **Due Date:** {deadline['due_date']}  
+                        📤 **Email Sent:** {'✅' if deadline['email_sent'] else '❌'}
+                        """)
@@ -1,3 +1,4 @@
+import threading
 import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
@@ -52,14 +53,14 @@ def custom_login(username, password):
     conn = get_connection()
     c = conn.cursor()
     c.execute("""
-        SELECT username, name FROM users
+        SELECT id, username, name FROM users
         WHERE username = %s AND password_hash = %s AND approved = TRUE
     """, (username, password))
     result = c.fetchone()
     conn.close()
     if result:
-        return result[0], result[1]  # username, name
-    return None, None
+        return _make_identity(result[0], result[1], result[2])
+    return None
 
 
 
@@ -69,4 +70,64 @@ def get_user_id(username):
     c.execute("SELECT id FROM users WHERE username = %s", (username,))
     result = c.fetchone()
     conn.close()
-    return result[0] if result else None
\ No newline at end of file
+    return result[0] if result else None
+
+
+
+# Session identity cache: the logged-in user is resolved once (login or
+# cookie restore) and kept in st.session_state. Deleting a user or changing
+# their approval bumps their revision, which makes every session holding
+# the older revision resolve the identity again on its next rerun.
+IDENTITY_SESSION_KEYS = ["identity", "authentication_status", "is_admin", "name", "username"]
+
+_identity_revisions = {}
+_identity_lock = threading.Lock()
+
+def _make_identity(user_id, username, name, is_admin=False):
+    return {
+        "id": user_id,
+        "username": username,
+        "name": name,
+        "is_admin": is_admin,
+        "revision": _identity_revisions.get(username, 0),
+    }
+
+def invalidate_identity(*usernames):
+    with _identity_lock:
+        for username in usernames:
+            _identity_revisions[username] = _identity_revisions.get(username, 0) + 1
+
+def load_identity(username):
+    """Resolve an approved user from the DB in one query, or None."""
+    revision = _identity_revisions.get(username, 0)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT id, username, name FROM users WHERE username = %s AND approved = TRUE", (username,))
+    result = c.fetchone()
+    conn.close()
+    if not result:
+        return None
+    identity = _make_identity(result[0], result[1], result[2])
+    identity["revision"] = revision
+    return identity
+
+def admin_identity(username, name):
+    return _make_identity(get_user_id(username), username, name, is_admin=True)
+
+def get_session_identity():
+    identity = st.session_state.get("identity")
+    if identity and identity["revision"] == _identity_revisions.get(identity["username"], 0):
+        return identity
+    return None
+
+def set_session_identity(identity):
+    st.session_state["identity"] = identity
+    st.session_state["authentication_status"] = True
+    st.session_state["is_admin"] = identity["is_admin"]
+    st.session_state["name"] = identity["name"]
+    st.session_state["username"] = identity["username"]
+
+def clear_session_identity():
+    for key in IDENTITY_SESSION_KEYS:
+        if key in st.session_state:
+            del st.session_state[key]
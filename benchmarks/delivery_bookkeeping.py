@@ -0,0 +1,98 @@
+"""Compare per-message delivery bookkeeping with the buffered DeliveryRecorder.
+
+Creates a temporary user with --messages deadlines (committed, removed at
+the end), then records one delivered email per deadline twice: the former
+way (a connection for the email_logs INSERT and another for the
+email_sent UPDATE, per message) and through delivery_log.DeliveryRecorder.
+
+    python benchmarks/delivery_bookkeeping.py --messages 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_connection
+from delivery_log import DeliveryRecorder, DELIVERY_FLUSH_SIZE
+
+def seed(messages):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO users (username, password_hash, name, email, approved)
+            VALUES ('bench_delivery', 'x', 'Bench delivery', 'bench_delivery@example.com', TRUE)
+            RETURNING id
+        """)
+        user_id = c.fetchone()[0]
+        c.execute("""
+            INSERT INTO clients (user_id, name, ice, email, type)
+            VALUES (%s, 'Client bench', '000000000000001', 'client@example.ma', 'SARL')
+            RETURNING id
+        """, (user_id,))
+        client_id = c.fetchone()[0]
+        c.execute("""
+            INSERT INTO deadlines (client_id, type, period, due_date, status)
+            SELECT %s, 'TVA', 'Mensuel', CURRENT_DATE + n %% 30, 'Pending'
+            FROM generate_series(1, %s) n
+            RETURNING id
+        """, (client_id, messages))
+        deadline_ids = [row[0] for row in c.fetchall()]
+    return user_id, deadline_ids
+
+def record_per_message(user_id, deadline_ids):
+    for deadline_id in deadline_ids:
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("INSERT INTO email_logs (user_id, deadline_id) VALUES (%s, %s)", (user_id, deadline_id))
+        conn.commit()
+        conn.close()
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = %s", (deadline_id,))
+        conn.commit()
+        conn.close()
+
+def record_buffered(user_id, deadline_ids, flush_size):
+    with DeliveryRecorder(flush_size=flush_size) as recorder:
+        for deadline_id in deadline_ids:
+            recorder.record_email(user_id, [deadline_id])
+    return recorder.flushes
+
+def reset(user_id):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM email_logs WHERE user_id = %s", (user_id,))
+        c.execute("""
+            UPDATE deadlines SET email_sent = FALSE
+            WHERE client_id IN (SELECT id FROM clients WHERE user_id = %s)
+        """, (user_id,))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--flush-size", type=int, default=DELIVERY_FLUSH_SIZE)
+    args = parser.parse_args()
+
+    user_id, deadline_ids = seed(args.messages)
+    try:
+        print(f"🧾 Recording {args.messages} delivered emails")
+        started = time.perf_counter()
+        record_per_message(user_id, deadline_ids)
+        elapsed = time.perf_counter() - started
+        print(f"  per message {elapsed:6.2f} s  {elapsed / args.messages * 1e6:8.0f} µs/msg")
+        reset(user_id)
+
+        started = time.perf_counter()
+        flushes = record_buffered(user_id, deadline_ids, args.flush_size)
+        elapsed = time.perf_counter() - started
+        print(f"  buffered    {elapsed:6.2f} s  {elapsed / args.messages * 1e6:8.0f} µs/msg  ({flushes} flush(es))")
+    finally:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM clients WHERE user_id = %s", (user_id,))
+            c.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+if __name__ == "__main__":
+    main()
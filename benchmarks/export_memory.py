@@ -0,0 +1,83 @@
+"""Compare peak Python memory of the streaming export with the old DataFrame export.
+
+Creates a temporary user with --deadlines deadlines (committed, removed at
+the end), then exports them with deadline_export.export_deadlines in each
+format and with the former read_sql + DataFrame.to_excel path, tracking
+peak allocations with tracemalloc.
+
+    python benchmarks/export_memory.py --deadlines 200000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import deadline_export
+from database import get_connection
+
+def seed(deadlines):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO users (username, password_hash, name, email, approved)
+            VALUES ('bench_export', 'x', 'Bench export', 'bench_export@example.com', TRUE)
+            RETURNING id
+        """)
+        user_id = c.fetchone()[0]
+        c.execute("""
+            INSERT INTO clients (user_id, name, ice, email, type)
+            SELECT %s, 'Client ' || n, lpad(n::text, 15, '0'), 'client' || n || '@example.ma', 'SARL'
+            FROM generate_series(1, 1000) n
+        """, (user_id,))
+        c.execute("""
+            INSERT INTO deadlines (client_id, type, period, due_date, status)
+            SELECT cl.id, 'TVA', (ARRAY['Mensuel', 'Trimestriel', 'Annuel', 'One Time'])[1 + n %% 4],
+                   CURRENT_DATE + (n %% 400 - 30), 'Pending'
+            FROM generate_series(1, %s) n
+            JOIN clients cl ON cl.user_id = %s AND cl.ice = lpad((1 + n %% 1000)::text, 15, '0')
+        """, (deadlines, user_id))
+    return user_id
+
+def legacy_export(user_id):
+    conn = get_connection()
+    df = pd.read_sql(deadline_export.EXPORT_QUERY, conn, params=(user_id,))
+    conn.close()
+    towrite = io.BytesIO()
+    df.to_excel(towrite, index=False, sheet_name="Mes Échéances")
+    return towrite
+
+def measure(label, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<16} {elapsed:6.1f} s  peak {peak / 1e6:7.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deadlines", type=int, default=200_000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    user_id = seed(args.deadlines)
+    try:
+        print(f"📤 Exporting {args.deadlines} deadlines")
+        for fmt in deadline_export.available_formats():
+            measure(f"streaming {fmt}", lambda: deadline_export.export_deadlines(user_id, fmt)[0].close())
+        if not args.skip_legacy:
+            measure("legacy xlsx", lambda: legacy_export(user_id))
+    finally:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM clients WHERE user_id = %s", (user_id,))
+            c.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+if __name__ == "__main__":
+    main()
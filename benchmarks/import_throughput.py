@@ -0,0 +1,72 @@
+"""Measure client/deadline import throughput on a synthetic CSV file.
+
+Builds a --rows line file (about 1% invalid rows, two deadlines per client),
+then times reading, validation and the COPY-based load. The load runs for a
+temporary user inside a transaction that is rolled back, so the database is
+left unchanged; pass --no-load to time the in-memory stages only.
+
+    python benchmarks/import_throughput.py --rows 100000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import client_import
+
+def make_csv(rows):
+    lines = [",".join(client_import.IMPORT_COLUMNS)]
+    for n in range(rows):
+        client = n // 2
+        ice = f"{client:015d}" if n % 100 else "not-an-ice"
+        lines.append(
+            f"Client {client},{ice},{client % 10**8},client{client}@example.ma,06{client % 10**8:08d},SARL,"
+            f"{'TVA' if n % 2 else 'CNSS'},Mensuel,2026-{n % 12 + 1:02d}-{n % 28 + 1:02d},Pending"
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+def timed(label, rows, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<10} {elapsed * 1000:8.0f} ms  {rows / elapsed:10.0f} rows/s")
+    return result, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--no-load", action="store_true", help="skip the database stage")
+    args = parser.parse_args()
+
+    data = make_csv(args.rows)
+    print(f"📄 {args.rows} rows, {len(data) / 1e6:.1f} MB")
+    df, read_time = timed("read", args.rows, client_import.read_upload, io.BytesIO(data), "bench.csv")
+    (rows, errors), validate_time = timed("validate", args.rows, client_import.validate_rows, df)
+    print(f"  {len(rows)} valid rows, {errors['line'].nunique()} rejected")
+    total = read_time + validate_time
+
+    if not args.no_load:
+        from database import get_connection
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO users (username, password_hash, name, email, approved)
+                VALUES ('bench_import', 'x', 'Bench import', 'bench_import@example.com', TRUE)
+                RETURNING id
+            """)
+            user_id = c.fetchone()[0]
+            result, load_time = timed("load", len(rows), client_import.import_rows, user_id, rows, conn=conn)
+            print(f"  {result['clients_created']} clients and {result['deadlines_created']} deadlines inserted")
+            total += load_time
+        finally:
+            conn.rollback()
+            conn.close()
+
+    print(f"⏱️ Total {total:.2f} s, {args.rows / total:.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
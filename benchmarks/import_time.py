@@ -0,0 +1,77 @@
+"""Measure the cold-start import cost of the login page with python -X importtime.
+
+Imports the modules main.py loads before any feature is opened in a fresh
+interpreter, prints the slowest ones, and exits non-zero when a heavy
+feature-only dependency sneaks back in or the total exceeds the budget.
+
+    python benchmarks/import_time.py --budget-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What main.py imports at module level
+STARTUP_MODULES = [
+    "streamlit",
+    "streamlit_cookies_manager",
+    "database",
+    "migrations",
+    "auth",
+    "features.registry",
+    "footer",
+    # Started in a background thread by main.py (OUTBOX_SENDER_IN_APP)
+    "outbox_sender",
+]
+
+# Only the feature pages that need them may import these
+FEATURE_ONLY_MODULES = ["twilio", "openpyxl", "pandas", "streamlit_calendar"]
+
+def measure(modules):
+    code = "import " + ", ".join(modules)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit("❌ Import failed:\n" + "\n".join(errors))
+    # Lines look like "import time:       412 |       1893 |   package.module"
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when the total import time exceeds this")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = measure(STARTUP_MODULES)
+    total_ms = sum(self_us for self_us, _ in timings.values()) / 1000
+    print(f"⏱️ {len(timings)} modules imported in {total_ms:.0f} ms")
+    for name, (_, cumulative_us) in sorted(timings.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    heavy = [
+        heavy_name for heavy_name in FEATURE_ONLY_MODULES
+        if any(name == heavy_name or name.startswith(heavy_name + ".") for name in timings)
+    ]
+    if heavy:
+        print(f"❌ Feature-only modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"❌ Startup imports take {total_ms:.0f} ms, budget is {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
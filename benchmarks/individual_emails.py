@@ -0,0 +1,109 @@
+"""Compare building individual emails one deadline at a time with the batch API.
+
+Creates a temporary user with --deadlines deadlines over 50 clients and a
+few templates (generic, per type, per client), all committed and removed
+at the end. It builds every deadline's email with the former per-deadline
+lookups (a connection and query for the deadline, another for its
+template), then with email_utils.build_individual_emails, and counts the
+queries of each.
+
+    python benchmarks/individual_emails.py --deadlines 500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_utils
+from database import get_connection
+
+def seed(deadlines):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO users (username, password_hash, name, email, approved)
+            VALUES ('bench_individual', 'x', 'Bench individual', 'bench_individual@example.com', TRUE)
+            RETURNING id
+        """)
+        user_id = c.fetchone()[0]
+        c.execute("""
+            INSERT INTO clients (user_id, name, ice, email, type)
+            SELECT %s, 'Client ' || n, lpad(n::text, 15, '0'), 'client' || n || '@example.ma', 'SARL'
+            FROM generate_series(1, 50) n
+            RETURNING id
+        """, (user_id,))
+        client_ids = [row[0] for row in c.fetchall()]
+        c.execute("""
+            INSERT INTO deadlines (client_id, type, period, due_date, status)
+            SELECT (%s::int[])[1 + n %% 50], (ARRAY['TVA', 'CNSS', 'IR', 'IS'])[1 + n %% 4], 'Mensuel',
+                   CURRENT_DATE + n %% 60, 'Pending'
+            FROM generate_series(1, %s) n
+            RETURNING id
+        """, (client_ids, deadlines))
+        deadline_ids = [row[0] for row in c.fetchall()]
+        c.execute("""
+            INSERT INTO message_templates (user_id, email_message, email_subject, deadline_type, client_id, days_before)
+            VALUES (%s, 'Bonjour {client_name}, rappel {deadline_type} le {due_date}.', 'Rappel', NULL, NULL, 1),
+                   (%s, 'TVA pour {client_name} le {due_date}.', 'TVA', 'TVA', NULL, 1),
+                   (%s, 'Client suivi: {client_name}, {deadline_type}.', 'Suivi', NULL, %s, 1)
+        """, (user_id, user_id, user_id, client_ids[0]))
+    return user_id, deadline_ids
+
+def build_per_deadline(deadline_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT c.name, c.email, c.id AS client_id, c.type, c.ice, c.if_number,
+               d.type AS deadline_type, d.period, d.due_date, u.id AS user_id
+        FROM deadlines d
+        JOIN clients c ON d.client_id = c.id
+        JOIN users u ON c.user_id = u.id
+        WHERE d.id = %s
+        LIMIT 1
+    """, (deadline_id,))
+    name, email, client_id, client_type, ice, if_number, deadline_type, period, due_date, user_id = c.fetchone()
+    conn.close()
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT email_message, email_subject
+        FROM message_templates
+        WHERE user_id = %s
+        AND (deadline_type = %s OR deadline_type IS NULL)
+        AND (client_id = %s OR client_id IS NULL)
+        ORDER BY created_at DESC LIMIT 1
+    """, (user_id, deadline_type, client_id))
+    template, subject = c.fetchone()
+    conn.close()
+    return template.format(client_name=name, client_email=email, client_phone="N/A", client_type=client_type,
+                           ice=ice, if_number=if_number, deadline_type=deadline_type, period=period,
+                           due_date=due_date, status="Pending")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deadlines", type=int, default=500)
+    args = parser.parse_args()
+
+    user_id, deadline_ids = seed(args.deadlines)
+    try:
+        print(f"✉️ Building {len(deadline_ids)} individual emails")
+        started = time.perf_counter()
+        for deadline_id in deadline_ids:
+            build_per_deadline(deadline_id)
+        elapsed = time.perf_counter() - started
+        print(f"  per deadline {elapsed * 1000:8.0f} ms  {2 * len(deadline_ids)} queries")
+
+        started = time.perf_counter()
+        messages, errors = email_utils.build_individual_emails(deadline_ids)
+        elapsed = time.perf_counter() - started
+        print(f"  batch        {elapsed * 1000:8.0f} ms  2 queries  ({len(messages)} built, {len(errors)} errors)")
+    finally:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM clients WHERE user_id = %s", (user_id,))
+            c.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+if __name__ == "__main__":
+    main()
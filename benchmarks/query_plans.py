@@ -0,0 +1,118 @@
+"""Compare query plans of the hot query paths with and without the migration 4 indexes.
+
+Everything runs in one transaction that is rolled back at the end: the
+optional synthetic data, the dropped indexes and the ANALYZE statistics.
+DROP INDEX takes exclusive locks, so point it at a copy of production data
+rather than the live database.
+
+    python benchmarks/query_plans.py --users 50 --clients 200 --deadlines 12
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_connection, init_db
+from migrations import HOT_PATH_INDEXES
+
+def seed(c, users, clients, deadlines):
+    c.execute("""
+        INSERT INTO users (username, password_hash, name, email, approved)
+        SELECT 'bench_' || u, 'x', 'Bench ' || u, 'bench_' || u || '@example.com', TRUE
+        FROM generate_series(1, %s) u
+    """, (users,))
+    c.execute("""
+        INSERT INTO clients (user_id, name, ice, email, type)
+        SELECT u.id, 'Client ' || u.id || '-' || n, 'ICE' || n, 'client' || u.id || '_' || n || '@example.com', 'SARL'
+        FROM users u, generate_series(1, %s) n
+        WHERE u.username LIKE 'bench\\_%%'
+    """, (clients,))
+    c.execute("""
+        INSERT INTO deadlines (client_id, type, period, due_date, status)
+        SELECT cl.id, (ARRAY['TVA', 'CNSS', 'IR', 'IS'])[1 + n %% 4],
+               (ARRAY['Mensuel', 'Trimestriel', 'Annuel', 'One Time'])[1 + n %% 4],
+               CURRENT_DATE + ((n * 37 + cl.id) %% 400 - 30),
+               CASE WHEN n %% 3 = 0 THEN 'Done' ELSE 'Pending' END
+        FROM clients cl
+        JOIN users u ON cl.user_id = u.id AND u.username LIKE 'bench\\_%%'
+        CROSS JOIN generate_series(1, %s) n
+    """, (deadlines,))
+    c.execute("""
+        INSERT INTO notes (user_id, content)
+        SELECT u.id, 'note ' || n FROM users u, generate_series(1, 20) n WHERE u.username LIKE 'bench\\_%%'
+    """)
+    c.execute("""
+        INSERT INTO message_templates (user_id, email_message, email_subject, days_before)
+        SELECT u.id, 'Bonjour {client_name}', 'Rappel', n FROM users u, generate_series(1, 3) n
+        WHERE u.username LIKE 'bench\\_%%'
+    """)
+
+def hot_queries(user_id):
+    today = datetime.now().date()
+    reminder_dates = [today + timedelta(days=d) for d in (20, 10, 5, 1)]
+    return [
+        ("reminder planner: pending deadlines due on the reminder dates", """
+            SELECT c.user_id, c.id, c.email, d.type, d.due_date, d.id
+            FROM deadlines d
+            JOIN clients c ON d.client_id = c.id
+            JOIN users u ON c.user_id = u.id
+            WHERE d.status = 'Pending' AND d.due_date = ANY(%s) AND u.approved = TRUE
+        """, (reminder_dates,)),
+        ("deadlines of one user (calendar, export, view)", """
+            SELECT d.id, c.name, d.type, d.due_date, d.status
+            FROM deadlines d
+            JOIN clients c ON d.client_id = c.id
+            WHERE c.user_id = %s
+            ORDER BY d.due_date ASC
+        """, (user_id,)),
+        ("message templates of one user", """
+            SELECT id, email_message FROM message_templates WHERE user_id = %s
+        """, (user_id,)),
+        ("notes of one user", """
+            SELECT id, content FROM notes WHERE user_id = %s ORDER BY id DESC
+        """, (user_id,)),
+        ("rollover: deadlines due on or before today", """
+            SELECT id, period FROM deadlines WHERE due_date <= CURRENT_DATE
+        """, ()),
+    ]
+
+def explain(c, query, params):
+    c.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+    return [row[0] for row in c.fetchall()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=0, help="synthetic users to add (0 uses existing data only)")
+    parser.add_argument("--clients", type=int, default=200, help="clients per synthetic user")
+    parser.add_argument("--deadlines", type=int, default=12, help="deadlines per synthetic client")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        if args.users:
+            seed(c, args.users, args.clients, args.deadlines)
+        c.execute("ANALYZE users; ANALYZE clients; ANALYZE deadlines; ANALYZE notes; ANALYZE message_templates")
+        c.execute("SELECT user_id FROM clients WHERE user_id IS NOT NULL GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")
+        row = c.fetchone()
+        queries = hot_queries(row[0] if row else 0)
+
+        for label, drop in (("WITHOUT hot-path indexes", True), ("WITH hot-path indexes", False)):
+            print(f"\n===== {label} =====")
+            c.execute("SAVEPOINT plans")
+            if drop:
+                for name, _ in HOT_PATH_INDEXES:
+                    c.execute(f"DROP INDEX IF EXISTS {name}")
+            for title, query, params in queries:
+                print(f"\n--- {title}")
+                print("\n".join(explain(c, query, params)))
+            c.execute("ROLLBACK TO SAVEPOINT plans")
+    finally:
+        conn.rollback()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
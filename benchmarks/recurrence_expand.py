@@ -0,0 +1,83 @@
+"""Time recurrence.expand_occurrences on synthetic deadline series.
+
+Expands --series random series (mixed periods, anchors spread over the year
+before the window) over a --days window, and checks a sample against a
+straightforward per-series loop with dateutil.
+
+    python benchmarks/recurrence_expand.py --series 100000 --days 365
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurrence import PERIOD_MONTHS, expand_occurrences
+
+PERIODS = ["Mensuel", "Trimestriel", "Annuel", "One Time"]
+
+def make_series(count, start, seed=0):
+    rng = np.random.default_rng(seed)
+    due_dates = np.datetime64(start, "D") + rng.integers(-365, 365, count)
+    periods = np.array(PERIODS, dtype=object)[rng.integers(0, len(PERIODS), count)]
+    return due_dates, periods
+
+def expand_loop(due_dates, periods, start, end):
+    """Reference implementation: walk each series one occurrence at a time."""
+    occurrences = []
+    for position, (due_date, period) in enumerate(zip(due_dates.tolist(), periods)):
+        step = PERIOD_MONTHS.get(period.lower())
+        if not step:
+            if start <= due_date <= end:
+                occurrences.append((position, due_date))
+            continue
+        k = 0
+        while True:
+            occurrence = due_date + relativedelta(months=k * step)
+            if occurrence > end:
+                break
+            if occurrence >= start:
+                occurrences.append((position, occurrence))
+            k += 1
+    return occurrences
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", type=int, default=5_000, help="series compared against the loop implementation")
+    args = parser.parse_args()
+
+    start = date.today()
+    end = start + timedelta(days=args.days)
+    due_dates, periods = make_series(args.series, start)
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        positions, dates = expand_occurrences(due_dates, periods, start, end)
+        timings.append(time.perf_counter() - started)
+    print(f"⏱️ {args.series} series -> {len(dates)} occurrences over {args.days} days: "
+          f"best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms")
+
+    sample = slice(0, args.check)
+    started = time.perf_counter()
+    expected = expand_loop(due_dates[sample], periods[sample], start, end)
+    loop_time = time.perf_counter() - started
+    positions, dates = expand_occurrences(due_dates[sample], periods[sample], start, end)
+    actual = list(zip(positions.tolist(), dates.tolist()))
+    print(f"🐢 Loop implementation: {loop_time * 1000:.1f} ms for {args.check} series "
+          f"(~{loop_time * args.series / args.check * 1000:.0f} ms extrapolated)")
+    if actual != expected:
+        print("❌ Vectorized and loop expansions differ")
+        sys.exit(1)
+    print("✅ Vectorized expansion matches the loop implementation")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Exercise SMS_utils.dispatch_sms against a local fake Twilio endpoint.
+
+Starts an HTTP server speaking the Messages.json API on 127.0.0.1 that
+answers after --latency-ms, rejects a share of requests with 429 (with a
+Retry-After header) or 503, and records the arrival time of every request.
+--messages SMS are then sent serially with deliver_sms and concurrently with
+dispatch_sms, printing throughput, retries and the highest request rate
+seen in any one-second window. No real SMS is sent.
+
+    python benchmarks/sms_dispatch.py --messages 200 --rate 50 --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SMS_utils
+
+class FakeTwilio(BaseHTTPRequestHandler):
+    latency = 0.05
+    throttle = 0.0
+    errors = 0.0
+    arrivals = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        with self.lock:
+            self.arrivals.append(time.monotonic())
+        time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.throttle:
+            self.reply(429, {"code": 20429, "message": "Too Many Requests"}, {"Retry-After": "0"})
+        elif roll < self.throttle + self.errors:
+            self.reply(503, {"code": 20503, "message": "Service Unavailable"})
+        elif not body.get("To"):
+            self.reply(400, {"code": 21604, "message": "A 'To' phone number is required."})
+        else:
+            self.reply(201, {"sid": f"SM{random.getrandbits(128):032x}", "status": "queued"})
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def peak_rate(arrivals):
+    arrivals = sorted(arrivals)
+    peak = start = 0
+    for end, arrived in enumerate(arrivals):
+        while arrived - arrivals[start] >= 1:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+def report(label, count, elapsed, failed):
+    arrivals = list(FakeTwilio.arrivals)
+    FakeTwilio.arrivals.clear()
+    print(f"  {label:<10} {elapsed:6.2f} s  {count / elapsed:7.1f} msg/s  {len(arrivals) - count:4d} retried request(s)  "
+          f"{failed} failed  peak {peak_rate(arrivals)} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50, help="token-bucket rate (msg/s)")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--throttle", type=float, default=0.05, help="share of requests answered 429")
+    parser.add_argument("--errors", type=float, default=0.02, help="share of requests answered 503")
+    args = parser.parse_args()
+
+    FakeTwilio.latency = args.latency_ms / 1000
+    FakeTwilio.throttle, FakeTwilio.errors = args.throttle, args.errors
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTwilio)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    SMS_utils.TWILIO_API_BASE = f"http://127.0.0.1:{server.server_port}"
+    SMS_utils.TWILIO_ACCOUNT_SID, SMS_utils.TWILIO_AUTH_TOKEN = "ACbench", "token"
+    SMS_utils.TWILIO_PHONE_NUMBER = "+15005550006"
+    SMS_utils.SMS_RETRY_BASE_DELAY = 0.05
+
+    messages = [{"to": f"+2126{n:08d}", "message": f"Rappel {n}"} for n in range(args.messages)]
+    print(f"📱 {args.messages} SMS, {args.latency_ms:.0f} ms latency, "
+          f"{args.throttle:.0%} throttled, {args.errors:.0%} server errors")
+
+    started = time.perf_counter()
+    failed = 0
+    for msg in messages:
+        try:
+            SMS_utils.deliver_sms(msg["to"], msg["message"])
+        except SMS_utils.SMSError:
+            failed += 1
+    report("serial", args.messages, time.perf_counter() - started, failed)
+
+    started = time.perf_counter()
+    results = SMS_utils.dispatch_sms(messages, workers=args.workers, rate=args.rate)
+    failed = sum(1 for _, error in results if error is not None)
+    report("dispatch", args.messages, time.perf_counter() - started, failed)
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
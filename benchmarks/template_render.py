@@ -0,0 +1,73 @@
+"""Time rendering reminder messages with str.format and with compiled templates.
+
+Renders --messages messages spread over --templates distinct templates (so
+the LRU cache sees hits and misses), first with str.format on the raw text
+as the senders used to, then through template_engine.get_template, and
+checks that both produce the same text.
+
+    python benchmarks/template_render.py --messages 100000 --templates 50
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import template_engine
+
+TEMPLATE = (
+    "Bonjour {client_name},\n\n"
+    "Votre échéance {deadline_type} ({period}) est prévue pour le {due_date:%d/%m/%Y}.\n"
+    "ICE: {ice} — IF: {if_number}\n"
+    "Merci de prendre les mesures nécessaires.\n\n"
+    "Cordialement,\nL'équipe ({template})"
+)
+
+def make_rows(count):
+    start = date(2026, 1, 1)
+    return [{
+        "client_name": f"Client {n}",
+        "client_email": f"client{n}@example.ma",
+        "client_phone": "N/A",
+        "client_type": "SARL",
+        "ice": f"{n:015d}",
+        "if_number": str(n),
+        "deadline_type": ("TVA", "CNSS", "IR", "IS")[n % 4],
+        "period": "Mensuel",
+        "due_date": start + timedelta(days=n % 365),
+        "status": "Pending",
+    } for n in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--templates", type=int, default=50)
+    parser.add_argument("--cache-size", type=int, default=template_engine.TEMPLATE_CACHE_SIZE)
+    args = parser.parse_args()
+
+    rows = make_rows(args.messages)
+    updated_at = datetime(2026, 1, 1)
+    templates = [TEMPLATE.replace("{template}", f"modèle {n}") for n in range(args.templates)]
+    print(f"✉️ {args.messages} messages, {args.templates} templates")
+
+    started = time.perf_counter()
+    expected = [templates[n % args.templates].format(**row) for n, row in enumerate(rows)]
+    baseline = time.perf_counter() - started
+    print(f"  str.format {baseline:6.2f} s  {args.messages / baseline:9.0f} msg/s")
+
+    cache = template_engine.TemplateCache(args.cache_size)
+    started = time.perf_counter()
+    rendered = [
+        cache.get(n % args.templates, updated_at, "email_message", templates[n % args.templates]).render(row)
+        for n, row in enumerate(rows)
+    ]
+    elapsed = time.perf_counter() - started
+    print(f"  compiled   {elapsed:6.2f} s  {args.messages / elapsed:9.0f} msg/s  "
+          f"({baseline / elapsed:.1f}x, {cache.hits} hits, {cache.misses} misses)")
+    assert rendered == expected, "compiled output differs from str.format"
+    print("✅ Same text as str.format")
+
+if __name__ == "__main__":
+    main()
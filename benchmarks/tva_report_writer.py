@@ -0,0 +1,185 @@
+"""Compare the TVA report writer with the former per-cell-styled writer.
+
+Builds a month with --invoices sales and purchases (every tenth one a FAC
+invoice, plus the previous credit), writes it with tva_report.write_tva_report
+in both workbook modes and with the former export_to_excel, and prints the
+time and peak Python memory (tracemalloc, in a second run) of each. A small
+report is first checked cell by cell against the former writer: values,
+merges, fills and fonts.
+
+    python benchmarks/tva_report_writer.py --invoices 20000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+from tva_report import write_tva_report
+
+def make_month(invoices, seed=0):
+    rng = np.random.default_rng(seed)
+    rates = rng.choice([7.0, 10.0, 14.0, 20.0], invoices)
+    ttc = np.round(rng.uniform(100, 50_000, invoices), 2)
+    ht = np.round(ttc / (1 + rates / 100), 2)
+    df = pd.DataFrame({
+        "Role": np.where(np.arange(invoices) % 3 == 0, "Fournisseur", "Client"),
+        "Service": [f"FAC {n}" if n % 10 == 0 else f"Prestation {n}" for n in range(invoices)],
+        "TTC": ttc, "HT": ht, "TVA Rate": rates, "TVA": np.round(ttc - ht, 2),
+    })
+    credit = pd.DataFrame([{"Role": "Fournisseur", "Service": "Crédit Précédent", "TTC": 0.0,
+                            "HT": 0.0, "TVA Rate": 0.0, "TVA": 1234.56}])
+    return pd.concat([credit, df], ignore_index=True)
+
+# The former features.tva_calculator.export_to_excel, kept as the baseline
+def legacy_export_to_excel(df, enterprise_name, date_str):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Rapport TVA"
+
+    for i in range(1, 100):
+        ws.row_dimensions[i].height = 22
+    for col in range(2, 7):
+        ws.column_dimensions[chr(64 + col)].width = 18
+
+    bold = Font(bold=True)
+    center = Alignment(horizontal="center")
+    border = Border(left=Side(style="thin"), right=Side(style="thin"),
+                    top=Side(style="thin"), bottom=Side(style="thin"))
+    grey_fill = PatternFill(start_color='C0C0C0', end_color='C0C0C0', fill_type='solid')
+    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+
+    def write_section(start_row, title, data, is_client, first_col_header):
+        ws.merge_cells(start_row=start_row, start_column=2, end_row=start_row, end_column=6)
+        ws.cell(row=start_row, column=2).value = title
+        ws.cell(row=start_row, column=2).font = Font(bold=True, size=12)
+        ws.cell(row=start_row, column=2).alignment = center
+
+        headers = [first_col_header, "MT TTC", "M. H.T", "Taux TVA", "TVA"]
+        for col_num, header in enumerate(headers, 2):
+            cell = ws.cell(row=start_row + 1, column=col_num)
+            cell.value = header
+            cell.font = bold
+            cell.alignment = center
+            cell.border = border
+
+        tva_total = 0
+        for i, row in enumerate(data, start=start_row + 2):
+            for j, key in enumerate(["Service", "TTC", "HT", "TVA Rate", "TVA"], 2):
+                cell = ws.cell(row=i, column=j)
+                if key == "TVA Rate":
+                    cell.value = f"{row[key]}%"
+                    cell.fill = grey_fill
+                else:
+                    cell.value = row[key]
+                cell.border = border
+                cell.font = Font(bold=True, size=12)
+                cell.alignment = Alignment(horizontal="center", vertical="center")
+                if key == "TVA":
+                    tva_total += row[key]
+                if row['Service'] == "Crédit Précédent":
+                    cell.fill = red_fill
+                elif row['Service'].upper().startswith("FAC"):
+                    cell.fill = yellow_fill
+                elif row['Service'].upper().startswith("FACTURE"):
+                    cell.fill = red_fill
+
+        total_row = start_row + 2 + len(data)
+        ws.merge_cells(start_row=total_row, start_column=2, end_row=total_row, end_column=5)
+        ws.cell(row=total_row, column=2).value = "la somme de TVA"
+        ws.cell(row=total_row, column=2).fill = green_fill
+        ws.cell(row=total_row, column=2).font = bold
+        ws.cell(row=total_row, column=2).alignment = center
+        ws.cell(row=total_row, column=6).value = round(tva_total, 2)
+        ws.cell(row=total_row, column=6).font = bold
+        ws.cell(row=total_row, column=6).fill = green_fill
+
+        return tva_total, total_row
+
+    clients = df[df['Role'] == 'Client'].to_dict(orient='records')
+    fournisseurs = df[df['Role'] == 'Fournisseur'].to_dict(orient='records')
+
+    credit_precedent_entries = [f for f in fournisseurs if f.get("Service") == "Crédit Précédent"]
+    other_fournisseurs = [f for f in fournisseurs if f.get("Service") != "Crédit Précédent"]
+    fournisseurs = other_fournisseurs + credit_precedent_entries
+
+    start_row_clients = 3
+    ca_title = f"C.A du {date_str}  {enterprise_name}"
+    tva_client, end_row_clients = write_section(
+        start_row_clients, ca_title, clients, is_client=True, first_col_header="Ventes")
+
+    ws.cell(row=end_row_clients + 1, column=2).value = "Nombre de Facture"
+    ws.cell(row=end_row_clients + 1, column=3).value = len(clients)
+    ws.cell(row=end_row_clients + 1, column=2).font = bold
+    ws.cell(row=end_row_clients + 1, column=2).fill = green_fill
+    ws.cell(row=end_row_clients + 1, column=3).font = bold
+    ws.cell(row=end_row_clients + 1, column=3).fill = green_fill
+
+    start_row_fournisseurs = end_row_clients + 3
+    tva_title = f"TVA RECUPERABLE le {date_str}"
+    tva_fournisseur, end_row_fournisseurs = write_section(
+        start_row_fournisseurs, tva_title, fournisseurs, is_client=False, first_col_header="Achats")
+
+    final_row = end_row_fournisseurs + 3
+    ws.merge_cells(start_row=final_row, start_column=2, end_row=final_row, end_column=5)
+    ws.cell(row=final_row, column=2).value = "TVA DUE"
+    ws.cell(row=final_row, column=2).font = Font(bold=True, color="FF0000")
+    ws.cell(row=final_row, column=2).fill = red_fill
+    ws.cell(row=final_row, column=2).alignment = center
+    ws.cell(row=final_row, column=6).value = round(tva_client - tva_fournisseur, 2)
+    ws.cell(row=final_row, column=6).font = Font(bold=True)
+
+    towrite = io.BytesIO()
+    wb.save(towrite)
+    towrite.seek(0)
+    return towrite
+
+def check_same(df):
+    legacy = load_workbook(legacy_export_to_excel(df, "Bench SARL", "01/2026"))["Rapport TVA"]
+    for write_only in (False, True):
+        report = load_workbook(write_tva_report(df, "Bench SARL", "01/2026", write_only=write_only))["Rapport TVA"]
+        assert sorted(map(str, report.merged_cells.ranges)) == sorted(map(str, legacy.merged_cells.ranges))
+        for row in legacy.iter_rows(min_col=2, max_col=6):
+            for cell in row:
+                other = report[cell.coordinate]
+                if cell.value is not None or other.value is not None:
+                    assert other.value == cell.value, (cell.coordinate, cell.value, other.value)
+                    assert other.fill.fgColor.rgb == cell.fill.fgColor.rgb, cell.coordinate
+                    assert other.font.b == cell.font.b and other.font.color == cell.font.color, cell.coordinate
+    print(f"✅ Same cells as the former writer on {len(df)} lines")
+
+def measure(label, func):
+    # Timed without tracemalloc, whose hooks slow allocation-heavy code down
+    started = time.perf_counter()
+    out = func()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<12} {elapsed:6.2f} s  peak {peak / 1e6:7.1f} MB  {len(out.getvalue()) / 1e6:5.1f} MB file")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20_000)
+    args = parser.parse_args()
+
+    check_same(make_month(200))
+    df = make_month(args.invoices)
+    print(f"🧾 Writing {len(df)} lines")
+    measure("former", lambda: legacy_export_to_excel(df, "Bench SARL", "01/2026"))
+    measure("named", lambda: write_tva_report(df, "Bench SARL", "01/2026", write_only=False))
+    measure("write-only", lambda: write_tva_report(df, "Bench SARL", "01/2026", write_only=True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import io
+import pandas as pd
+from database import get_connection, bump_data_version
+from email_utils import EMAIL_REGEX
+
+# Accepted values, as offered by the "Add Client" and "Add Deadline" forms
+CLIENT_TYPES = ["SARL", "Auto-Entrepreneur", "SAS", "Other"]
+DEADLINE_TYPES = ["TVA", "CNSS", "IR", "IS", "Other"]
+PERIODS = ["One Time", "Mensuel", "Trimestriel", "Annuel"]
+STATUSES = ["Pending", "Done"]
+
+# One row per client, or per client deadline: rows sharing an ICE describe
+# the same client and may each carry one deadline.
+IMPORT_COLUMNS = ["name", "ice", "if_number", "email", "phone", "type", "deadline_type", "period", "due_date", "status"]
+
+# Header spellings accepted besides IMPORT_COLUMNS, after lowercasing
+COLUMN_ALIASES = {
+    "nom": "name", "client": "name", "raison sociale": "name",
+    "i.c.e": "ice", "if": "if_number", "i.f": "if_number",
+    "téléphone": "phone", "telephone": "phone", "tel": "phone",
+    "type_client": "type", "type client": "type",
+    "type_échéance": "deadline_type", "type_echeance": "deadline_type",
+    "période": "period", "periode": "period",
+    "date_d'échéance": "due_date", "date_echeance": "due_date",
+    "statut": "status",
+}
+
+ICE_PATTERN = r"\d{15}"
+IF_PATTERN = r"\d{1,15}"
+PHONE_PATTERN = r"\+?\d{9,15}"
+
+def read_upload(data, filename):
+    """Read an uploaded CSV or XLSX file into a frame of stripped strings with IMPORT_COLUMNS.
+
+    data is a binary file object. CSV files may use ',' or ';' (Excel's
+    French locale) as separator.
+    """
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        df = pd.read_excel(data, dtype=str, keep_default_na=False)
+    else:
+        first_line = data.readline()
+        data.seek(0)
+        sep = ";" if first_line.count(b";") > first_line.count(b",") else ","
+        df = pd.read_csv(data, dtype=str, keep_default_na=False, sep=sep, encoding="utf-8-sig")
+    df.columns = [COLUMN_ALIASES.get(str(col).strip().lower(), str(col).strip().lower()) for col in df.columns]
+    missing = [col for col in ("name", "ice") if col not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes obligatoires manquantes: {', '.join(missing)}")
+    df = df.reindex(columns=IMPORT_COLUMNS, fill_value="")
+    return df.apply(lambda col: col.astype(str).str.strip())
+
+def _canonical(values, choices):
+    """Map values case-insensitively onto choices; unknown values become NaN."""
+    return values.str.lower().map({choice.lower(): choice for choice in choices})
+
+def validate_rows(df):
+    """Normalize a copy of df and collect per-row errors, one vectorized pass per rule.
+
+    Returns (rows, errors): the normalized rows with their file line number
+    in "line", and a frame of (line, column, value, error) for every failed
+    check. A row with any error is left out of the import.
+    """
+    rows = df.copy()
+    # Header is line 1 of the file
+    rows.insert(0, "line", rows.index.to_numpy() + 2)
+    rows["phone"] = rows["phone"].str.replace(r"[\s.\-/()]", "", regex=True)
+    rows["ice"] = rows["ice"].str.replace(r"\s", "", regex=True)
+
+    has_deadline = (rows["deadline_type"] != "") | (rows["due_date"] != "")
+    client_type = _canonical(rows["type"].replace("", "Other"), CLIENT_TYPES)
+    deadline_type = _canonical(rows["deadline_type"], DEADLINE_TYPES)
+    period = _canonical(rows["period"].replace("", "One Time"), PERIODS)
+    status = _canonical(rows["status"].replace("", "Pending"), STATUSES)
+    iso = pd.to_datetime(rows["due_date"], format="%Y-%m-%d", errors="coerce")
+    due_date = iso.fillna(pd.to_datetime(rows["due_date"], format="%d/%m/%Y", errors="coerce"))
+
+    checks = [
+        ("name", rows["name"] == "", "Nom obligatoire"),
+        ("ice", ~rows["ice"].str.fullmatch(ICE_PATTERN), "ICE invalide (15 chiffres)"),
+        ("if_number", (rows["if_number"] != "") & ~rows["if_number"].str.fullmatch(IF_PATTERN), "IF invalide (chiffres uniquement)"),
+        ("email", (rows["email"] != "") & ~rows["email"].str.match(EMAIL_REGEX.pattern), "Email invalide"),
+        ("phone", (rows["phone"] != "") & ~rows["phone"].str.fullmatch(PHONE_PATTERN), "Téléphone invalide"),
+        ("type", client_type.isna(), f"Type de client inconnu ({', '.join(CLIENT_TYPES)})"),
+        ("deadline_type", has_deadline & deadline_type.isna(), f"Type d'échéance inconnu ({', '.join(DEADLINE_TYPES)})"),
+        ("period", has_deadline & period.isna(), f"Période inconnue ({', '.join(PERIODS)})"),
+        ("due_date", has_deadline & due_date.isna(), "Date d'échéance invalide (AAAA-MM-JJ ou JJ/MM/AAAA)"),
+        ("status", has_deadline & status.isna(), f"Statut inconnu ({', '.join(STATUSES)})"),
+    ]
+    errors = pd.concat([
+        pd.DataFrame({"line": rows.loc[mask, "line"], "column": column, "value": df.loc[mask, column], "error": message})
+        for column, mask, message in checks if mask.any()
+    ] or [pd.DataFrame(columns=["line", "column", "value", "error"])], ignore_index=True)
+
+    rows["type"] = client_type
+    rows["deadline_type"] = deadline_type.where(has_deadline)
+    rows["period"] = period.where(has_deadline)
+    rows["status"] = status.where(has_deadline)
+    rows["due_date"] = due_date.dt.date.where(has_deadline)
+    rows = rows[~rows["line"].isin(errors["line"])]
+    return rows, errors.sort_values(["line", "column"], kind="stable").reset_index(drop=True)
+
+def copy_rows(rows, conn):
+    """COPY the valid rows into a temporary table dropped at the end of the transaction."""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TEMP TABLE import_rows (
+            line INT,
+            name TEXT,
+            ice TEXT,
+            if_number TEXT,
+            email TEXT,
+            phone TEXT,
+            type TEXT,
+            deadline_type TEXT,
+            period TEXT,
+            due_date DATE,
+            status TEXT
+        ) ON COMMIT DROP
+    """)
+    buffer = io.StringIO()
+    rows[["line"] + IMPORT_COLUMNS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    c.copy_expert("COPY import_rows FROM STDIN WITH (FORMAT csv)", buffer)
+    # Temporary tables are never auto-analyzed; without stats the dedupe joins get nested loops
+    c.execute("ANALYZE import_rows")
+
+def import_rows(user_id, rows, conn=None):
+    """Load validated rows for user_id in one transaction.
+
+    Clients are deduplicated by ICE, both within the file (first row wins)
+    and against the user's existing clients, which receive the deadlines
+    instead. Deadlines identical to an existing one (client, type, due date)
+    are skipped. Pass conn to make the import part of the caller's
+    transaction; otherwise it commits here.
+    """
+    result = {"clients_created": 0, "clients_existing": 0, "deadlines_created": 0, "deadlines_skipped": 0}
+    if rows.empty:
+        return result
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        copy_rows(rows, conn)
+        c = conn.cursor()
+        # ICE -> client id of every client the file refers to: existing ones first,
+        # then the ones created below. Kept in a table so the planner has stats.
+        c.execute("""
+            CREATE TEMP TABLE import_targets ON COMMIT DROP AS
+            SELECT DISTINCT ON (c.ice) c.ice::text AS ice, c.id
+            FROM clients c
+            JOIN (SELECT DISTINCT ice FROM import_rows) r ON r.ice = c.ice
+            WHERE c.user_id = %s
+            ORDER BY c.ice, c.id
+        """, (user_id,))
+        result["clients_existing"] = c.rowcount
+        c.execute("""
+            WITH created AS (
+                INSERT INTO clients (user_id, name, ice, if_number, email, phone, type)
+                SELECT %s, name, ice, NULLIF(if_number, ''), NULLIF(email, ''), NULLIF(phone, ''), type
+                FROM (
+                    SELECT DISTINCT ON (ice) * FROM import_rows ORDER BY ice, line
+                ) r
+                WHERE NOT EXISTS (SELECT 1 FROM import_targets t WHERE t.ice = r.ice)
+                ORDER BY line
+                RETURNING ice, id
+            )
+            INSERT INTO import_targets SELECT ice, id FROM created
+        """, (user_id,))
+        result["clients_created"] = c.rowcount
+        c.execute("ANALYZE import_targets")
+        c.execute("""
+            WITH incoming AS (
+                SELECT DISTINCT ON (t.id, r.deadline_type, r.due_date)
+                       t.id AS client_id, r.deadline_type, r.period, r.due_date, r.status, r.line
+                FROM import_rows r
+                JOIN import_targets t ON t.ice = r.ice
+                WHERE r.due_date IS NOT NULL
+                ORDER BY t.id, r.deadline_type, r.due_date, r.line
+            )
+            INSERT INTO deadlines (client_id, type, period, due_date, status)
+            SELECT client_id, deadline_type, period, due_date, status
+            FROM incoming i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM deadlines d
+                WHERE d.client_id = i.client_id AND d.type = i.deadline_type AND d.due_date = i.due_date
+            )
+            ORDER BY line
+        """)
+        result["deadlines_created"] = c.rowcount
+        result["deadlines_skipped"] = int(rows["due_date"].notna().sum()) - result["deadlines_created"]
+        if own_conn:
+            conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    bump_data_version(user_id)
+    return result
+
+def import_file(user_id, data, filename, conn=None):
+    """Read, validate and load an uploaded file; returns the counts and the error report."""
+    df = read_upload(data, filename)
+    rows, errors = validate_rows(df)
+    result = import_rows(user_id, rows, conn=conn)
+    result.update({"rows": len(df), "valid": len(rows), "errors": errors})
+    return result
+
+def template_csv():
+    return (",".join(IMPORT_COLUMNS) + "\n"
+            "Exemple SARL,001234567000089,12345678,contact@exemple.ma,0612345678,SARL,TVA,Mensuel,2025-01-20,Pending\n")
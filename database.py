@@ -1,6 +1,10 @@
 import os
+import threading
+import time
 import psycopg2
+from psycopg2 import pool
 from dotenv import load_dotenv
+from migrations import MIGRATIONS, LATEST_VERSION
 
 load_dotenv()
 DATABASE_URL = os.getenv("CONNECTION_URL")
@@ -11,116 +15,237 @@ elif "localhost" in DATABASE_URL or "127.0.0.1" in DATABASE_URL:
 else:
     print("🔐 Loaded CONNECTION_URL (likely from GitHub Secrets):", DATABASE_URL)
 
-def get_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Connection pool settings (DB_POOL_MIN connections stay open while idle)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
 
-def init_db():
-    conn = get_connection()
-    c = conn.cursor()
 
-    # Create users table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(255) NOT NULL UNIQUE,
-            password_hash VARCHAR(255) NOT NULL,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL UNIQUE,
-            phone VARCHAR(20),
-            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            approved BOOLEAN DEFAULT FALSE,
-            approved_by VARCHAR(255),
-            approved_at TIMESTAMP
-        )
-    """)
+class PooledConnection:
+    """Proxy around a pooled psycopg2 connection.
 
-    # Create clients table with user_id foreign key
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS clients (
-            id SERIAL PRIMARY KEY,
-            user_id INT,
-            name VARCHAR(255) NOT NULL,
-            ice VARCHAR(255),
-            if_number VARCHAR(255),
-            email VARCHAR(255),
-            phone VARCHAR(255),
-            type VARCHAR(255),
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE SET NULL
-        )
-    """)
+    close() hands the connection back to the pool instead of closing it, so
+    the existing ``conn = get_connection() ... conn.close()`` call sites reuse
+    connections. Used as a context manager it commits on success, rolls back
+    on error and then releases the connection.
+    """
 
-    # Create deadlines table with client_id foreign key
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS deadlines (
-            id SERIAL PRIMARY KEY,
-            client_id INT,
-            type VARCHAR(255),
-            period VARCHAR(255),
-            due_date DATE,
-            status VARCHAR(255),
-            email_sent BOOLEAN DEFAULT FALSE,
-            sms_sent BOOLEAN DEFAULT FALSE,
-            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-        )
-    """)
+    def __init__(self, manager, conn):
+        self._manager = manager
+        self._conn = conn
 
-    # Create notes table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id SERIAL PRIMARY KEY,
-            user_id INT NOT NULL,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """)
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
 
-    # Create email_logs table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS email_logs (
-            id SERIAL PRIMARY KEY,
-            user_id INT,
-            deadline_id INT,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
-        )
-    """)
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
 
-    # Create sms_logs table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS sms_logs (
-            id SERIAL PRIMARY KEY,
-            user_id INT,
-            deadline_id INT,
-            phone VARCHAR(20),
-            message TEXT,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
-        )
-    """)
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._manager.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        # Safety net for call sites that forget close() on an error path
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Process-wide ThreadedConnectionPool with waiting, health checks and metrics."""
+
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+            "in_use": 0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_AFTER:
+            return True
+        try:
+            with conn.cursor() as c:
+                c.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self):
+        pg_pool = self._get_pool()
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise pool.PoolError(f"no database connection available after {self.timeout}s")
+            waited = time.monotonic() - started
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        try:
+            conn = pg_pool.getconn()
+            while not self._is_healthy(conn):
+                pg_pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                with self._lock:
+                    self._stats["discarded"] += 1
+                conn = pg_pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            broken = conn.closed
+            if not broken and conn.status != psycopg2.extensions.STATUS_READY:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._get_pool().putconn(conn, close=broken)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def connection(self):
+        return PooledConnection(self, self.acquire())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_wait_time"] = stats["wait_time_total"] / stats["waits"] if stats["waits"] else 0.0
+        stats["min_size"] = self.minconn
+        stats["max_size"] = self.maxconn
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+
+
+db_pool = ConnectionPool(DATABASE_URL)
+
+# pg_advisory_xact_lock key held while migrations run
+SCHEMA_LOCK_KEY = 7_240_531
+
+def get_connection():
+    return db_pool.connection()
+
+def get_pool_stats():
+    return db_pool.stats()
+
+# Per-user counters bumped whenever a user's deadlines change in this process.
+# Cached views (e.g. the calendar) include the version in their cache key;
+# changes made by other processes (rollover job) are picked up by cache TTLs.
+_data_versions = {}
+_data_versions_lock = threading.Lock()
+
+def get_data_version(user_id):
+    return (_data_versions.get(None, 0), _data_versions.get(user_id, 0))
+
+def bump_data_version(*user_ids):
+    """Invalidate cached views of the given users, or of everyone when called without ids."""
+    with _data_versions_lock:
+        for user_id in user_ids or (None,):
+            _data_versions[user_id] = _data_versions.get(user_id, 0) + 1
 
-    # Create message_templates table
+def get_schema_version(conn):
+    c = conn.cursor()
+    c.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not c.fetchone()[0]:
+        return 0
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return c.fetchone()[0]
+
+def init_db():
+    """Apply pending migrations from migrations.py and return the schema version."""
+    conn = get_connection()
+    if get_schema_version(conn) >= LATEST_VERSION:
+        conn.close()
+        return LATEST_VERSION
+
+    c = conn.cursor()
+    # Serialize concurrent starters; the lock is released at commit
+    c.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
     c.execute("""
-        CREATE TABLE IF NOT EXISTS message_templates (
-            id SERIAL PRIMARY KEY,
-            user_id INT NOT NULL,
-            email_message TEXT,
-            sms_message TEXT,
-            email_subject VARCHAR(255),
-            deadline_type VARCHAR(255),
-            client_id INT,
-            days_before INT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE SET NULL
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    current = get_schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            c.execute(statement)
+        c.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+        print(f"🗄️ Migration {version} appliquée: {description}")
 
     conn.commit()
     c.close()
     conn.close()
+    return LATEST_VERSION
 
 def get_all_users():
     conn = get_connection()
@@ -165,4 +290,188 @@ def delete_deadline(deadline_id):
     c = conn.cursor()
     c.execute("DELETE FROM deadlines WHERE id = %s", (deadline_id,))
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+def _like_pattern(search):
+    """ILIKE pattern matching search anywhere, with % and _ taken literally (ESCAPE '\\'), or None."""
+    if not search or not search.strip():
+        return None
+    escaped = search.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_users(search=None, limit=20, offset=0):
+    """One page of approved users with client/deadline counts, and the number of matches."""
+    pattern = _like_pattern(search)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        WITH page AS (
+            SELECT u.id, u.username, u.name, u.email, u.phone, u.registered_at,
+                   count(*) OVER () AS total
+            FROM users u
+            WHERE u.approved = TRUE
+              AND (%(pattern)s::text IS NULL
+                   OR u.username ILIKE %(pattern)s ESCAPE '\\'
+                   OR u.name ILIKE %(pattern)s ESCAPE '\\'
+                   OR u.email ILIKE %(pattern)s ESCAPE '\\')
+            ORDER BY u.name, u.id
+            LIMIT %(limit)s OFFSET %(offset)s
+        )
+        SELECT p.id, p.username, p.name, p.email, p.phone, p.registered_at,
+               COALESCE(s.client_count, 0) AS client_count,
+               COALESCE(s.deadline_count, 0) AS deadline_count,
+               COALESCE(s.pending_count, 0) AS pending_count,
+               p.total
+        FROM page p
+        LEFT JOIN LATERAL (
+            SELECT count(DISTINCT cl.id) AS client_count,
+                   count(d.id) AS deadline_count,
+                   count(d.id) FILTER (WHERE d.status = 'Pending') AS pending_count
+            FROM clients cl
+            LEFT JOIN deadlines d ON d.client_id = cl.id
+            WHERE cl.user_id = p.id
+        ) s ON TRUE
+        ORDER BY p.name, p.id
+    """, {
+        "pattern": pattern,
+        "limit": limit,
+        "offset": offset,
+    })
+    rows = c.fetchall()
+    conn.close()
+    users = [dict(zip([col[0] for col in c.description], row)) for row in rows]
+    total = users[0].pop("total") if users else 0
+    for user in users:
+        user.pop("total", None)
+    return users, total
+
+def get_client_summaries(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT cl.id, cl.name, cl.ice, cl.email, cl.type,
+               count(d.id) AS deadline_count,
+               count(d.id) FILTER (WHERE d.status = 'Pending') AS pending_count
+        FROM clients cl
+        LEFT JOIN deadlines d ON d.client_id = cl.id
+        WHERE cl.user_id = %s
+        GROUP BY cl.id
+        ORDER BY cl.name, cl.id
+    """, (user_id,))
+    rows = c.fetchall()
+    conn.close()
+    return [dict(zip([col[0] for col in c.description], row)) for row in rows]
+
+# Bulk admin operations: each runs as one statement with an id array. Pass
+# conn to make them part of a larger transaction; otherwise they commit.
+
+def _run_bulk(query, params, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    c = conn.cursor()
+    c.execute(query, params)
+    rows = c.fetchall() if c.description else []
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return rows
+
+def approve_users(user_ids, approved_by, conn=None):
+    """Approve pending users; returns (id, username, name, email, phone) of those approved."""
+    return _run_bulk("""
+        UPDATE users
+        SET approved = TRUE, approved_by = %s, approved_at = CURRENT_TIMESTAMP
+        WHERE id = ANY(%s) AND approved = FALSE
+        RETURNING id, username, name, email, phone
+    """, (approved_by, list(user_ids)), conn)
+
+def delete_users(user_ids, conn=None):
+    """Delete users with their clients and deadlines; returns the deleted usernames.
+
+    clients.user_id is ON DELETE SET NULL, so the clients are deleted
+    explicitly, in the same transaction; their deadlines follow by cascade.
+    """
+    user_ids = list(user_ids)
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    _run_bulk("DELETE FROM clients WHERE user_id = ANY(%s)", (user_ids,), conn)
+    rows = _run_bulk("DELETE FROM users WHERE id = ANY(%s) RETURNING username", (user_ids,), conn)
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return [row[0] for row in rows]
+
+def delete_clients(client_ids, conn=None):
+    return len(_run_bulk("DELETE FROM clients WHERE id = ANY(%s) RETURNING id", (list(client_ids),), conn))
+
+def delete_deadlines(deadline_ids, conn=None):
+    return len(_run_bulk("DELETE FROM deadlines WHERE id = ANY(%s) RETURNING id", (list(deadline_ids),), conn))
+
+def reassign_clients(client_ids, to_user_id, conn=None):
+    return len(_run_bulk(
+        "UPDATE clients SET user_id = %s WHERE id = ANY(%s) RETURNING id",
+        (to_user_id, list(client_ids)), conn
+    ))
+
+def get_user_choices():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT id, username, name FROM users WHERE approved = TRUE ORDER BY name, id")
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+# Sort directions of "View Deadlines" and the keyset comparison each one pages with
+DEADLINE_PAGE_ORDERS = {"asc": ">", "desc": "<"}
+
+def get_deadlines_page(user_id, search=None, status=None, after=None, limit=25, order="asc"):
+    """One keyset page of a user's deadlines, ordered by (due_date, id).
+
+    Deadlines without a due date come last in both orders. after is the
+    (due_date, id) of the last row of the previous page, due_date possibly
+    None. Returns the rows and whether another page follows.
+    """
+    comparison = DEADLINE_PAGE_ORDERS[order]
+    direction = order.upper()
+    if after is None:
+        keyset = "TRUE"
+    elif after[0] is None:
+        # Already in the NULL tail: only later ids among undated rows remain
+        keyset = f"d.due_date IS NULL AND d.id {comparison} %(after_id)s"
+    else:
+        # A row comparison with a NULL date is NULL, so the undated tail is added explicitly
+        keyset = f"((d.due_date, d.id) {comparison} (%(after_date)s::date, %(after_id)s::int) OR d.due_date IS NULL)"
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT
+            d.id AS deadline_id,
+            c.name AS client_name,
+            c.type AS client_type,
+            d.type AS deadline_type,
+            d.period,
+            d.due_date,
+            d.status,
+            d.email_sent
+        FROM deadlines d
+        JOIN clients c ON d.client_id = c.id
+        WHERE c.user_id = %(user_id)s
+          AND (%(pattern)s::text IS NULL OR c.name ILIKE %(pattern)s ESCAPE '\\')
+          AND (%(status)s::text IS NULL OR d.status = %(status)s)
+          AND {keyset}
+        ORDER BY d.due_date {direction} NULLS LAST, d.id {direction}
+        LIMIT %(limit)s
+    """, {
+        "user_id": user_id,
+        "pattern": _like_pattern(search),
+        "status": status,
+        "after_date": after[0] if after else None,
+        "after_id": after[1] if after else None,
+        "limit": limit + 1,
+    })
+    rows = c.fetchall()
+    conn.close()
+    columns = [col[0] for col in c.description]
+    return [dict(zip(columns, row)) for row in rows[:limit]], len(rows) > limit
@@ -0,0 +1,182 @@
+import csv
+import importlib.util
+import io
+import os
+from datetime import date
+from tempfile import SpooledTemporaryFile
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from database import get_connection
+from recurrence import expand_occurrences, period_steps
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+# Exports bigger than this spill from memory to a temporary file (bytes)
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+
+EXPORT_QUERY = """
+    SELECT
+        d.id AS "id",
+        c.name AS "client",
+        c.type AS "type_client",
+        d.type AS "type_Échéance",
+        d.period AS "période",
+        d.due_date AS "Date_d'échéance",
+        d.status AS "statut",
+        CASE WHEN d.email_sent THEN 'Envoyé' ELSE 'Non envoyé' END AS "Email_Envoyé"
+    FROM deadlines d
+    JOIN clients c ON d.client_id = c.id
+    WHERE c.user_id = %s
+    ORDER BY d.due_date ASC, d.id ASC
+"""
+EXPORT_COLUMNS = ["id", "client", "type_client", "type_Échéance", "période", "Date_d'échéance", "statut", "Email_Envoyé"]
+DATE_COLUMN = "Date_d'échéance"
+PERIOD_COLUMN = "période"
+OCCURRENCE_COLUMN = "Occurrence"
+
+EXPORT_FORMATS = {
+    "xlsx": ("mes_echeances.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("mes_echeances.csv", "text/csv"),
+    "parquet": ("mes_echeances.parquet", "application/vnd.apache.parquet"),
+}
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or parquet_available()]
+
+def iter_deadline_chunks(user_id, horizon_months=0, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Yield a user's export rows as DataFrames of at most chunk_size deadlines.
+
+    Rows come from a named (server-side) cursor, so only one chunk is held
+    in memory, ordered by due date (NULL last) then id. With horizon_months,
+    an extra "Occurrence" column is added: every stored row is kept with its
+    own due date there, and each recurring deadline is directly followed by
+    its later occurrences up to the horizon, in date order. progress, if
+    given, is called with the number of deadlines read so far after every
+    chunk.
+    """
+    today = date.today()
+    horizon_end = today + relativedelta(months=horizon_months)
+    conn = get_connection()
+    try:
+        c = conn.cursor(name="deadline_export")
+        c.itersize = chunk_size
+        c.execute(EXPORT_QUERY, (user_id,))
+        fetched = 0
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            fetched += len(rows)
+            if progress:
+                progress(fetched)
+            df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+            if horizon_months:
+                df = with_occurrences(df, today, horizon_end)
+            yield df
+        c.close()
+    finally:
+        conn.close()
+
+def with_occurrences(df, start, end):
+    """df with an Occurrence column and the virtual occurrences of its recurring rows in [start, end].
+
+    Stored rows all stay, NULL due dates included, with their due date as
+    occurrence. The occurrences a recurring row adds come right after it, in
+    date order, without repeating the one the stored row already is.
+    """
+    df = df.reset_index(drop=True)
+    stored = df.assign(**{OCCURRENCE_COLUMN: df[DATE_COLUMN]})
+    due = df[DATE_COLUMN].to_numpy()
+    recurring = np.flatnonzero(df[DATE_COLUMN].notna().to_numpy() & (period_steps(df[PERIOD_COLUMN].to_numpy()) > 0))
+    positions, dates = expand_occurrences(due[recurring], df[PERIOD_COLUMN].to_numpy()[recurring], start, end)
+    rows = recurring[positions]
+    occurrences = pd.Series(dates).dt.date.to_numpy()
+    added = occurrences != due[rows]
+    virtual = df.iloc[rows[added]].assign(**{OCCURRENCE_COLUMN: occurrences[added]})
+    # The stable sort keeps each stored row ahead of its occurrences, which are already in date order
+    return pd.concat([stored, virtual]).sort_index(kind="stable").reset_index(drop=True)
+
+def write_csv(chunks, out):
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    header = True
+    for df in chunks:
+        df.to_csv(text, index=False, header=header, quoting=csv.QUOTE_MINIMAL)
+        header = False
+    text.flush()
+    text.detach()
+
+def write_xlsx(chunks, out):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Mes Échéances")
+    header = True
+    for df in chunks:
+        if header:
+            ws.append(list(df.columns))
+            header = False
+        for row in df.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(out)
+
+def write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for df in chunks:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                # A column that is all NULL in the first chunk would otherwise be typed null
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+                ])
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+def count_deadlines(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT count(*) FROM deadlines d JOIN clients c ON d.client_id = c.id WHERE c.user_id = %s", (user_id,))
+    count = c.fetchone()[0]
+    conn.close()
+    return count
+
+def export_deadlines(user_id, fmt="xlsx", horizon_months=0, out=None, progress=None):
+    """Write a user's deadlines in fmt to out, chunk by chunk.
+
+    Without out, the file goes to a SpooledTemporaryFile (in memory up to
+    EXPORT_SPOOL_MAX_BYTES) returned rewound. Returns (file, row_count).
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if out is None:
+        out = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES, mode="w+b")
+    count = 0
+
+    def counted(chunks):
+        nonlocal count
+        for df in chunks:
+            count += len(df)
+            yield df
+
+    chunks = counted(iter_deadline_chunks(user_id, horizon_months, progress=progress))
+    first = next(chunks, None)
+    if first is None:
+        # Keep the header for an empty export
+        first = pd.DataFrame(columns=EXPORT_COLUMNS + ([OCCURRENCE_COLUMN] if horizon_months else []))
+    WRITERS[fmt](_prepend(first, chunks), out)
+    out.seek(0)
+    return out, count
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
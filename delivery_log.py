@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from psycopg2.extras import execute_values
+from database import get_connection
+
+# Buffered outcomes are written once this many are pending...
+DELIVERY_FLUSH_SIZE = int(os.getenv("DELIVERY_FLUSH_SIZE", "500"))
+# ...or once the oldest has waited this long, checked when the next outcome is recorded (seconds)
+DELIVERY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "2"))
+
+class DeliveryRecorder:
+    """Buffers delivered emails and SMS and writes their bookkeeping in batches.
+
+    A flush inserts every pending email_logs and sms_logs row with one
+    multi-row INSERT each and sets email_sent / sms_sent with one
+    UPDATE ... WHERE id = ANY(%s) per channel. Reminders recorded with their
+    occurrence date and offset also go into delivery_ledger, skipping rows
+    already there, so the planners do not send them again. Recording is
+    thread-safe, so sender threads can share a recorder. Use it as a context
+    manager, or call flush() at the end, so nothing is left in the buffer.
+
+    flush_interval is only checked when an outcome is recorded; there is no
+    timer, so a buffer that stops receiving outcomes waits for flush().
+    When a write fails, its rows go back into the buffer for the next flush.
+    A flush triggered by record_email / record_sms then only logs the error,
+    since the message itself was delivered; flush() raises it.
+
+    When conn is given, flushes run in the caller's transaction and are not
+    committed here.
+    """
+
+    def __init__(self, flush_size=DELIVERY_FLUSH_SIZE, flush_interval=DELIVERY_FLUSH_INTERVAL, conn=None):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.conn = conn
+        self._email_logs = []
+        self._sms_logs = []
+        self._email_sent = set()
+        self._sms_sent = set()
+        self._ledger = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.recorded = 0
+
+    def record_email(self, user_id, deadline_ids, occurrence_date=None, offset_days=None):
+        with self._lock:
+            for deadline_id in deadline_ids:
+                self._email_logs.append((user_id, deadline_id))
+                self._email_sent.add(deadline_id)
+            self._add_to_ledger("email", user_id, deadline_ids, occurrence_date, offset_days)
+            self._recorded()
+
+    def record_sms(self, user_id, deadline_ids, phone, message, occurrence_date=None, offset_days=None):
+        with self._lock:
+            for deadline_id in deadline_ids:
+                self._sms_logs.append((user_id, deadline_id, phone, message))
+                self._sms_sent.add(deadline_id)
+            self._add_to_ledger("sms", user_id, deadline_ids, occurrence_date, offset_days)
+            self._recorded()
+
+    def _add_to_ledger(self, channel, user_id, deadline_ids, occurrence_date, offset_days):
+        if occurrence_date is None or offset_days is None:
+            return
+        self._ledger.extend(
+            (deadline_id, occurrence_date, offset_days, channel, user_id) for deadline_id in deadline_ids
+        )
+
+    def _recorded(self):
+        self.recorded += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self._pending() >= self.flush_size or time.monotonic() - self._oldest >= self.flush_interval:
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"⚠️ Journal d'envoi non écrit, nouvel essai au prochain enregistrement: {e}")
+
+    def _pending(self):
+        return len(self._email_logs) + len(self._sms_logs)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending():
+            return
+        email_logs, self._email_logs = self._email_logs, []
+        sms_logs, self._sms_logs = self._sms_logs, []
+        email_sent, self._email_sent = self._email_sent, set()
+        sms_sent, self._sms_sent = self._sms_sent, set()
+        ledger, self._ledger = self._ledger, []
+        self._oldest = None
+        try:
+            if self.conn is None:
+                # Commits on success, rolls back on error, and returns the connection to the pool either way
+                with get_connection() as conn:
+                    self._write(conn, email_logs, sms_logs, email_sent, sms_sent, ledger)
+            else:
+                self._write(self.conn, email_logs, sms_logs, email_sent, sms_sent, ledger)
+        except Exception:
+            # Keep the outcomes, or the next run would send these messages again
+            self._email_logs[:0] = email_logs
+            self._sms_logs[:0] = sms_logs
+            self._email_sent |= email_sent
+            self._sms_sent |= sms_sent
+            self._ledger[:0] = ledger
+            self._oldest = time.monotonic()
+            raise
+        self.flushes += 1
+
+    def _write(self, conn, email_logs, sms_logs, email_sent, sms_sent, ledger):
+        c = conn.cursor()
+        if email_logs:
+            execute_values(c, "INSERT INTO email_logs (user_id, deadline_id) VALUES %s", email_logs,
+                           page_size=len(email_logs))
+            c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = ANY(%s)", (sorted(email_sent),))
+        if sms_logs:
+            execute_values(c, "INSERT INTO sms_logs (user_id, deadline_id, phone, message) VALUES %s", sms_logs,
+                           page_size=len(sms_logs))
+            c.execute("UPDATE deadlines SET sms_sent = TRUE WHERE id = ANY(%s)", (sorted(sms_sent),))
+        if ledger:
+            execute_values(c, """
+                INSERT INTO delivery_ledger (deadline_id, occurrence_date, offset_days, channel, user_id)
+                VALUES %s
+                ON CONFLICT ON CONSTRAINT uq_delivery_ledger DO NOTHING
+            """, ledger, page_size=len(ledger))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
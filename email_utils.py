@@ -4,11 +4,18 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from database import get_connection
 from auth import get_user_id
+import outbox
+from delivery_log import DeliveryRecorder
 from dotenv import load_dotenv
 import os
 import re
-from dateutil.relativedelta import relativedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rollover import roll_over_deadlines
 from collections import defaultdict
+from rate_limiter import RateLimiter
+from template_engine import TemplateError, compile_template, get_template
 
 EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
@@ -16,153 +23,274 @@ def is_valid_email(email):
     return bool(email) and EMAIL_REGEX.match(email)
 
 load_dotenv()
-SMTP_SERVER = os.getenv("SMTP_SERVER")
-SMTP_PORT = int(os.getenv("SMTP_PORT"))
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-
-def get_user_id_by_email(email):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM clients WHERE email = %s LIMIT 1", (email,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
-
-def log_email_sent(user_id, deadline_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO email_logs (user_id, deadline_id) VALUES (%s, %s)", (user_id, deadline_id))
-    conn.commit()
-    conn.close()
-
-def send_email(to_email, subject, message):
+# Reconnect after this many messages (providers cap messages per session)
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", "100"))
+# Idle sessions older than this are reopened instead of reused (seconds)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# Concurrent dispatch: worker threads (one SMTP session each) and global send rate
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+EMAIL_RATE_PER_SEC = float(os.getenv("EMAIL_RATE_PER_SEC", "10"))
+
+# Replies meaning "this session is done, try again on a new one"
+SMTP_RECONNECT_CODES = {421, 451, 452, 454}
+
+def smtp_error_retryable(error):
+    """False for permanent (5xx) refusals of a message, which sending it again would only repeat.
+
+    Authentication failures stay retryable: they concern the sender's
+    settings, not the message.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return not all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    return True
+
+_smtp_config = None
+
+def get_smtp_config():
+    """SMTP settings, read from the environment on first use."""
+    global _smtp_config
+    if _smtp_config is None:
+        _smtp_config = {
+            "server": os.getenv("SMTP_SERVER"),
+            "port": int(os.getenv("SMTP_PORT")),
+            "address": os.getenv("EMAIL_ADDRESS"),
+            "password": os.getenv("EMAIL_PASSWORD"),
+        }
+    return _smtp_config
+
+def build_message(to_email, subject, message):
     msg = MIMEMultipart()
-    msg["From"] = EMAIL_ADDRESS
+    msg["From"] = get_smtp_config()["address"]
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.attach(MIMEText(message, "plain"))
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.send_message(msg)
-        print("✅ Email envoyé avec succès !")
+    return msg
+
+class Mailer:
+    """Keeps one authenticated SMTP session open across many messages.
+
+    The session is opened on the first send, reopened when the server drops
+    it, answers with a session-limit code, after max_messages_per_session
+    messages or after idle_timeout seconds without use.
+    """
+
+    def __init__(self, server=None, port=None, address=None, password=None,
+                 max_messages_per_session=SMTP_MAX_MESSAGES_PER_SESSION, idle_timeout=SMTP_IDLE_TIMEOUT):
+        config = get_smtp_config()
+        self.server = server or config["server"]
+        self.port = port or config["port"]
+        self.address = address or config["address"]
+        self.password = password or config["password"]
+        self.max_messages_per_session = max_messages_per_session
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._session_sent = 0
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.sessions = 0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+        try:
+            smtp.starttls()
+            smtp.login(self.address, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self._session_sent = 0
+        self.sessions += 1
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def _session_expired(self):
+        return (
+            self._session_sent >= self.max_messages_per_session
+            or time.monotonic() - self._last_used > self.idle_timeout
+        )
 
-def send_template_emails(user_id):
-    print(f"📧 Traitement des emails de modèle pour user_id: {user_id}")
+    def send(self, to_email, subject, message):
+        msg = build_message(to_email, subject, message)
+        with self._lock:
+            for attempt in range(2):
+                if self._smtp is not None and self._session_expired():
+                    self._disconnect()
+                if self._smtp is None:
+                    self._connect()
+                try:
+                    self._smtp.send_message(msg)
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    self._smtp = None
+                    if attempt:
+                        raise
+                    print(f"🔌 Connexion SMTP perdue, reconnexion: {e}")
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code not in SMTP_RECONNECT_CODES or attempt:
+                        raise
+                    self._disconnect()
+                    print(f"🔌 Limite de session SMTP atteinte ({e.smtp_code}), reconnexion")
+            self._session_sent += 1
+            self._last_used = time.monotonic()
+            self.sent += 1
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def dispatch_messages(messages, workers=EMAIL_WORKERS, rate=EMAIL_RATE_PER_SEC):
+    """Send planned messages in parallel under a global rate limit.
+
+    Each worker thread owns its own Mailer session. Returns (message, error)
+    pairs in input order, error being None when the message was sent; an
+    error's retryable attribute tells whether sending again may succeed.
+    """
+    limiter = RateLimiter(rate)
+    local = threading.local()
+    mailers = []
+    mailers_lock = threading.Lock()
+
+    def send_one(msg):
+        mailer = getattr(local, "mailer", None)
+        if mailer is None:
+            mailer = local.mailer = Mailer()
+            with mailers_lock:
+                mailers.append(mailer)
+        limiter.acquire()
+        try:
+            mailer.send(msg["to"], msg["subject"], msg["message"])
+            return msg, None
+        except Exception as e:
+            e.retryable = smtp_error_retryable(e)
+            return msg, e
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(send_one, messages))
+    for mailer in mailers:
+        mailer.close()
+
+    elapsed = time.monotonic() - started
+    sent = sum(1 for _, error in results if error is None)
+    if results:
+        print(f"📨 {sent}/{len(results)} emails en {elapsed:.1f}s avec {len(mailers)} session(s) SMTP "
+              f"({sent / elapsed if elapsed else 0.0:.2f} msg/s)")
+    return results
+
+DEFAULT_REMINDER_DAYS = [20, 10, 5, 1]
+
+def _default_reminder_message(name, days_before, deadlines):
+    tasks = "\n".join([f"- {d['task_type']} ({d['period']}) - Due {d['due_date']}" for d in deadlines])
+    message = (
+        f"Bonjour {name},\n\n"
+        f"Il reste {days_before} jour(s) avant l'échéance suivante :\n\n"
+        f"{tasks}\n\n"
+        f"Merci de prendre les mesures nécessaires."
+    )
+    subject = f"Rappel : {len(deadlines)} échéance(s) dans {days_before} jour(s)"
+    return subject, message
+
+def plan_reminders(days_list=DEFAULT_REMINDER_DAYS, user_id=None):
+    """Build the whole send plan of a reminder run in a fixed number of queries.
+
+    Default reminders (one email per client address and offset in days_list)
+    come first; template emails then only go to deadlines that no earlier
+    message of the run already covers. Reminders already in delivery_ledger
+    for the same occurrence, offset and channel are left out, so a re-run
+    only plans what was not delivered. Returns a dict keyed by
+    (user_id, client_email, days_before) whose values are lists of messages.
+    """
+    # recurrence pulls in numpy and pandas; keep them off the app's startup path
+    from recurrence import PERIOD_MONTHS, expand_occurrences
+    today = datetime.now().date()
     conn = get_connection()
     c = conn.cursor()
-    c.execute("""
-        SELECT id, email_message, email_subject, deadline_type, client_id, days_before
-        FROM message_templates
-        WHERE user_id = %s AND email_message IS NOT NULL
-    """, (user_id,))
-    templates = c.fetchall()
-    conn.close()
-    print(f"📋 {len(templates)} modèles trouvés pour user_id {user_id}")
-
-    for template_id, email_message_template, email_subject, deadline_type, client_id, days_before in templates:
-        print(f"🔍 Modèle ID {template_id}: days_before={days_before}, deadline_type={deadline_type or 'All'}, client_id={client_id or 'All'}")
-        reminder_date = (datetime.now() + timedelta(days=days_before)).date()
-        reminder_date_str = reminder_date.strftime("%Y-%m-%d")
-        print(f"📅 Date de rappel: {reminder_date_str} (aujourd'hui + {days_before} jours)")
-
-        query = """
-            SELECT c.id AS client_id, c.name, c.email, c.type, c.ice, c.if_number,
-                   d.type AS deadline_type, d.period, d.due_date, d.status, d.id AS deadline_id
-            FROM deadlines d
-            JOIN clients c ON d.client_id = c.id
-            WHERE d.status = 'Pending' AND DATE(d.due_date) = %s AND d.email_sent = FALSE AND c.user_id = %s
-        """
-        params = [reminder_date_str, user_id]
-        if deadline_type:
-            query += " AND d.type = %s"
-            params.append(deadline_type)
-        if client_id:
-            query += " AND c.id = %s"
-            params.append(client_id)
-
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
-        print(f"🔎 {len(rows)} échéances correspondantes trouvées pour le modèle ID {template_id}")
-
-        if not rows:
-            print(f"ℹ️ Aucune échéance correspondante pour le modèle ID {template_id} le {reminder_date_str}")
-            continue
 
-        for row in rows:
-            client_id, client_name, client_email, client_type, ice, if_number, deadline_type, period, due_date, status, deadline_id = row
-            if not is_valid_email(client_email):
-                print(f"⚠️ Ignorer l'email invalide: {client_email}")
-                continue
+    query = """
+        SELECT t.id, t.user_id, t.email_message, t.email_subject, t.deadline_type, t.client_id, t.days_before, t.updated_at
+        FROM message_templates t
+        JOIN users u ON t.user_id = u.id
+        WHERE u.approved = TRUE AND t.email_message IS NOT NULL AND t.days_before IS NOT NULL
+    """
+    params = []
+    if user_id:
+        query += " AND t.user_id = %s"
+        params.append(user_id)
+    query += " ORDER BY t.user_id, t.id"
+    c.execute(query, params)
+    templates = c.fetchall()
 
-            try:
-                message = email_message_template.format(
-                    client_name=client_name,
-                    client_email=client_email,
-                    client_phone="N/A",
-                    client_type=client_type or "N/A",
-                    ice=ice or "N/A",
-                    if_number=if_number or "N/A",
-                    deadline_type=deadline_type,
-                    period=period,
-                    due_date=due_date,
-                    status=status
-                )
-            except KeyError as e:
-                print(f"❌ Variable invalide dans le modèle ID {template_id}: {e}")
-                continue
+    offsets = set(days_list) | {template[6] for template in templates}
+    if not offsets:
+        # No default offsets and no templates: nothing to plan
+        conn.close()
+        return {}
+    reminder_dates = sorted(today + timedelta(days=days_before) for days_before in offsets)
 
-            try:
-                send_email(client_email, email_subject or f"Rappel: {deadline_type} ({days_before} jours)", message)
-                log_email_sent(user_id, deadline_id)
-                conn = get_connection()
-                c = conn.cursor()
-                c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = %s", (deadline_id,))
-                conn.commit()
-                conn.close()
-                print(f"✅ Email envoyé à {client_email} pour le modèle ID {template_id}, échéance ID {deadline_id}")
-            except Exception as e:
-                print(f"❌ Échec de l'envoi de l'email à {client_email}: {e}")
+    # Recurring series due before a reminder date may still have an occurrence on it
+    query = """
+        SELECT c.user_id, c.id AS client_id, c.name, c.email, c.type, c.ice, c.if_number,
+               d.type AS deadline_type, d.period, d.due_date, d.status, d.id AS deadline_id
+        FROM deadlines d
+        JOIN clients c ON d.client_id = c.id
+        JOIN users u ON c.user_id = u.id
+        WHERE d.status = 'Pending' AND u.approved = TRUE
+          AND (d.due_date = ANY(%s) OR (d.due_date <= %s AND lower(d.period) = ANY(%s)))
+    """
+    params = [reminder_dates, reminder_dates[-1], list(PERIOD_MONTHS)]
+    if user_id:
+        query += " AND c.user_id = %s"
+        params.append(user_id)
+    query += " ORDER BY d.due_date ASC, d.id ASC"
+    c.execute(query, params)
+    rows = c.fetchall()
 
-def send_reminders(days_list=[1], username=None):
-    user_id = get_user_id(username) if username else None
-    
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE deadlines SET email_sent = FALSE WHERE email_sent = TRUE")
-    conn.commit()
+    # Anti-join with the ledger: (deadline, occurrence, offset) already emailed
+    c.execute("""
+        SELECT deadline_id, occurrence_date, offset_days
+        FROM delivery_ledger
+        WHERE channel = 'email' AND deadline_id = ANY(%s) AND occurrence_date = ANY(%s)
+    """, (sorted({row[11] for row in rows}), reminder_dates))
+    delivered = set(c.fetchall())
     conn.close()
+    print(f"📋 {len(templates)} modèles et {len(rows)} échéances chargés pour {len(reminder_dates)} dates de rappel, "
+          f"{len(delivered)} rappel(s) déjà envoyé(s)")
 
-    for days_before in days_list:
-        conn = get_connection()
-        c = conn.cursor()
-        reminder_date = (datetime.now() + timedelta(days=days_before)).strftime("%Y-%m-%d")
-        query = """
-        SELECT c.id AS client_id, c.name, c.email, d.type, d.period, d.due_date, d.id AS deadline_id
-        FROM deadlines d
-        JOIN clients c ON d.client_id = c.id
-        WHERE d.status = 'Pending' AND d.due_date = %s
-        """
-        params = (reminder_date,)
-        if user_id:
-            query += " AND c.user_id = %s"
-            params += (user_id,)
-        query += " ORDER BY d.due_date ASC"
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
+    # Rows are keyed by occurrence date, with due_date replaced by that occurrence
+    rows_by_date = defaultdict(list)
+    wanted = set(reminder_dates)
+    positions, dates = expand_occurrences([row[9] for row in rows], [row[8] for row in rows], reminder_dates[0], reminder_dates[-1])
+    for position, occurrence in zip(positions.tolist(), dates.tolist()):
+        if occurrence in wanted:
+            rows_by_date[occurrence].append(rows[position][:9] + (occurrence,) + rows[position][10:])
 
-        if not rows:
-            print(f"ℹ️ Aucun rappel par défaut pour {days_before} jours avant.")
-            continue
+    plan = defaultdict(list)
+    covered = set()
 
+    for days_before in days_list:
         client_deadlines = defaultdict(list)
-        for client_id, name, email, task_type, period, due_date, deadline_id in rows:
-            client_deadlines[email].append({
+        for row_user_id, client_id, name, email, _, _, _, task_type, period, due_date, _, deadline_id in rows_by_date[today + timedelta(days=days_before)]:
+            if (deadline_id, due_date, days_before) in delivered:
+                continue
+            client_deadlines[(row_user_id, email)].append({
                 "client_id": client_id,
                 "name": name,
                 "task_type": task_type,
@@ -171,154 +299,232 @@ def send_reminders(days_list=[1], username=None):
                 "deadline_id": deadline_id
             })
 
-        for email, deadlines in client_deadlines.items():
+        if not client_deadlines:
+            print(f"ℹ️ Aucun rappel par défaut pour {days_before} jours avant.")
+            continue
+
+        for (row_user_id, email), deadlines in client_deadlines.items():
             if not is_valid_email(email):
                 print(f"⚠️ Ignorer l'email invalide: {email}")
                 continue
+            subject, message = _default_reminder_message(deadlines[0]["name"], days_before, deadlines)
+            deadline_ids = [d["deadline_id"] for d in deadlines]
+            covered.update((d["deadline_id"], d["due_date"]) for d in deadlines)
+            plan[(row_user_id, email, days_before)].append({
+                "user_id": row_user_id,
+                "to": email,
+                "subject": subject,
+                "message": message,
+                "deadline_ids": deadline_ids,
+                "days_before": days_before,
+                "occurrence_date": today + timedelta(days=days_before),
+                "template_id": None
+            })
+
+    for template_id, template_user_id, email_message_template, email_subject, template_type, template_client_id, days_before, updated_at in templates:
+        try:
+            compiled = get_template(template_id, updated_at, "email_message", email_message_template)
+        except TemplateError as e:
+            print(f"❌ Modèle ID {template_id} ignoré: {e}")
+            continue
+        for row in rows_by_date[today + timedelta(days=days_before)]:
+            row_user_id, client_id, client_name, client_email, client_type, ice, if_number, deadline_type, period, due_date, status, deadline_id = row
+            if row_user_id != template_user_id or (deadline_id, due_date) in covered:
+                continue
+            if (deadline_id, due_date, days_before) in delivered:
+                continue
+            if template_type and deadline_type != template_type:
+                continue
+            if template_client_id and client_id != template_client_id:
+                continue
+            if not is_valid_email(client_email):
+                print(f"⚠️ Ignorer l'email invalide: {client_email}")
+                continue
 
-            tasks = "\n".join([f"- {d['task_type']} ({d['period']}) - Due {d['due_date']}" for d in deadlines])
-            message = (
-                f"Bonjour {deadlines[0]['name']},\n\n"
-                f"Il reste {days_before} jour(s) avant l'échéance suivante :\n\n"
-                f"{tasks}\n\n"
-                f"Merci de prendre les mesures nécessaires."
-            )
-            subject = f"Rappel : {len(deadlines)} échéance(s) dans {days_before} jour(s)"
+            message = compiled.render({
+                "client_name": client_name,
+                "client_email": client_email,
+                "client_phone": "N/A",
+                "client_type": client_type or "N/A",
+                "ice": ice or "N/A",
+                "if_number": if_number or "N/A",
+                "deadline_type": deadline_type,
+                "period": period,
+                "due_date": due_date,
+                "status": status
+            })
 
-            try:
-                send_email(email, subject, message)
-                conn = get_connection()
-                c = conn.cursor()
-                for d in deadlines:
-                    log_email_sent(user_id or get_user_id_by_email(email), d["deadline_id"])
-                    c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = %s", (d["deadline_id"],))
-                conn.commit()
-                conn.close()
-                print(f"✅ Rappel par défaut envoyé à {email}")
-            except Exception as e:
-                print(f"❌ Échec de l'envoi du rappel par défaut à {email}: {e}")
+            covered.add((deadline_id, due_date))
+            plan[(row_user_id, client_email, days_before)].append({
+                "user_id": row_user_id,
+                "to": client_email,
+                "subject": email_subject or f"Rappel: {deadline_type} ({days_before} jours)",
+                "message": message,
+                "deadline_ids": [deadline_id],
+                "days_before": days_before,
+                "occurrence_date": due_date,
+                "template_id": template_id
+            })
 
-    if user_id:
-        try:
-            send_template_emails(user_id)
-            print(f"📧 Emails de modèle traités pour user_id {user_id}")
-        except Exception as e:
-            print(f"❌ ERREUR lors de l'envoi des emails de modèle pour user_id {user_id}: {e}")
+    return dict(plan)
+
+def send_plan(plan, workers=EMAIL_WORKERS, rate=EMAIL_RATE_PER_SEC):
+    messages = [msg for messages in plan.values() for msg in messages]
+    results = dispatch_messages(messages, workers=workers, rate=rate)
+
+    sent = failed = 0
+    with DeliveryRecorder() as recorder:
+        for msg, error in results:
+            if error is not None:
+                failed += 1
+                print(f"❌ Échec de l'envoi de l'email à {msg['to']}: {error}")
+                continue
+            recorder.record_email(msg["user_id"], msg["deadline_ids"], msg.get("occurrence_date"), msg.get("days_before"))
+            sent += 1
+            if msg["template_id"]:
+                print(f"✅ Email envoyé à {msg['to']} pour le modèle ID {msg['template_id']}")
+            else:
+                print(f"✅ Rappel par défaut envoyé à {msg['to']}")
+    return sent, failed
 
-def send_individual_email(deadline_id):
+def send_template_emails(user_id):
+    print(f"📧 Traitement des emails de modèle pour user_id: {user_id}")
+    send_plan(plan_reminders(days_list=[], user_id=user_id))
+
+def send_reminders(days_list=[1], username=None):
+    user_id = get_user_id(username) if username else None
+    send_plan(plan_reminders(days_list=days_list, user_id=user_id))
+
+DEFAULT_INDIVIDUAL_TEMPLATE = compile_template(
+    "Bonjour {client_name},\n\n"
+    "Ceci est un rappel pour la tâche suivante :\n"
+    "- Type: {deadline_type}\n"
+    "- Période: {period}\n"
+    "- Date limite: {due_date}\n\n"
+    "Merci de prendre les mesures nécessaires."
+)
+
+class TemplateIndex:
+    """Email templates of some users, indexed by (user, deadline type, client).
+
+    A NULL deadline type or client in a template matches any. resolve()
+    returns the most specific template of a user for a deadline, trying
+    type and client, then client only, then type only, then neither; among
+    templates with the same filters the newest wins.
+    """
+
+    def __init__(self, templates):
+        self._best = {}
+        # Oldest first, so a newer template overwrites an older one with the same key
+        for template in sorted(templates, key=lambda t: (t["created_at"], t["id"])):
+            self._best[(template["user_id"], template["deadline_type"], template["client_id"])] = template
+
+    def resolve(self, user_id, deadline_type, client_id):
+        for key in ((deadline_type, client_id), (None, client_id), (deadline_type, None), (None, None)):
+            template = self._best.get((user_id,) + key)
+            if template is not None:
+                return template
+        return None
+
+def build_individual_emails(deadline_ids):
+    """Build the email of each deadline in two queries; returns (messages, errors).
+
+    One query loads the deadlines with their client, one loads every email
+    template of their owners, and each deadline's template is then resolved
+    from a TemplateIndex. errors maps a deadline id that cannot be emailed to
+    the reason.
+    """
+    deadline_ids = list(dict.fromkeys(deadline_ids))
+    if not deadline_ids:
+        return [], {}
     conn = get_connection()
     c = conn.cursor()
     c.execute("""
-        SELECT c.name, c.email, c.id AS client_id, c.type, c.ice, c.if_number,
-               d.type AS deadline_type, d.period, d.due_date, u.id AS user_id
+        SELECT d.id, c.name, c.email, c.id AS client_id, c.type, c.ice, c.if_number,
+               d.type AS deadline_type, d.period, d.due_date, c.user_id
         FROM deadlines d
         JOIN clients c ON d.client_id = c.id
-        JOIN users u ON c.user_id = u.id
-        WHERE d.id = %s
-        LIMIT 1
-    """, (deadline_id,))
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        raise ValueError("Échéance non trouvée.")
-    name, email, client_id, client_type, ice, if_number, deadline_type, period, due_date, user_id = row
-    if not is_valid_email(email):
-        raise ValueError(f"Email invalide: {email}")
+        WHERE d.id = ANY(%s)
+    """, (deadline_ids,))
+    rows = {row[0]: row for row in c.fetchall()}
 
-    conn = get_connection()
-    c = conn.cursor()
+    user_ids = sorted({row[10] for row in rows.values()})
     c.execute("""
-        SELECT email_message, email_subject
+        SELECT id, user_id, deadline_type, client_id, created_at, updated_at, email_message, email_subject
         FROM message_templates
-        WHERE user_id = %s
-        AND (deadline_type = %s OR deadline_type IS NULL)
-        AND (client_id = %s OR client_id IS NULL)
-        ORDER BY created_at DESC LIMIT 1
-    """, (user_id, deadline_type, client_id))
-    template = c.fetchone()
-    conn.close()
-
-    if template:
-        email_message_template, subject = template
-    else:
-        email_message_template = (
-            f"Bonjour {name},\n\n"
-            f"Ceci est un rappel pour la tâche suivante :\n"
-            f"- Type: {deadline_type}\n"
-            f"- Période: {period}\n"
-            f"- Date limite: {due_date}\n\n"
-            f"Merci de prendre les mesures nécessaires."
-        )
-        subject = f"Rappel: échéance {deadline_type}"
-
-    try:
-        message = email_message_template.format(
-            client_name=name,
-            client_email=email,
-            client_phone="N/A",
-            client_type=client_type or "N/A",
-            ice=ice or "N/A",
-            if_number=if_number or "N/A",
-            deadline_type=deadline_type,
-            period=period,
-            due_date=due_date,
-            status="Pending"
-        )
-    except KeyError as e:
-        raise ValueError(f"Variable invalide dans le modèle: {e}")
-
-    send_email(email, subject, message)
-    log_email_sent(user_id, deadline_id)
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = %s", (deadline_id,))
-    conn.commit()
+        WHERE user_id = ANY(%s) AND email_message IS NOT NULL
+    """, (user_ids,))
+    columns = [col[0] for col in c.description]
+    index = TemplateIndex(dict(zip(columns, row)) for row in c.fetchall())
     conn.close()
 
-def process_today_deadlines():
-    conn = get_connection()
-    c = conn.cursor()
-    today = datetime.now().date()
-    today_str = today.strftime("%Y-%m-%d")
-    c.execute("""
-        SELECT id, period, due_date
-        FROM deadlines
-        WHERE due_date = %s
-    """, (today_str,))
-    deadlines = c.fetchall()
-
-    for deadline_id, period, due_date in deadlines:
-        if isinstance(due_date, str):
-            due_date = datetime.strptime(due_date, "%Y-%m-%d").date()
-
-        if period.lower() == "mensuel":
-            new_due = due_date + relativedelta(months=1)
-        elif period.lower() == "trimestriel":
-            new_due = due_date + relativedelta(months=3)
-        elif period.lower() == "annuel":
-            new_due = due_date + relativedelta(years=1)
-        else:  # one time
-            c.execute("DELETE FROM deadlines WHERE id = %s", (deadline_id,))
+    messages, errors = [], {}
+    for deadline_id in deadline_ids:
+        row = rows.get(deadline_id)
+        if row is None:
+            errors[deadline_id] = "Échéance non trouvée."
+            continue
+        _, name, email, client_id, client_type, ice, if_number, deadline_type, period, due_date, user_id = row
+        if not is_valid_email(email):
+            errors[deadline_id] = f"Email invalide: {email}"
             continue
 
-        c.execute("UPDATE deadlines SET due_date = %s WHERE id = %s",
-                  (new_due.strftime("%Y-%m-%d"), deadline_id))
+        template = index.resolve(user_id, deadline_type, client_id)
+        if template:
+            try:
+                compiled = get_template(template["id"], template["updated_at"], "email_message", template["email_message"])
+            except TemplateError as e:
+                errors[deadline_id] = f"Modèle ID {template['id']} invalide: {e}"
+                continue
+            subject = template["email_subject"] or f"Rappel: échéance {deadline_type}"
+        else:
+            compiled = DEFAULT_INDIVIDUAL_TEMPLATE
+            subject = f"Rappel: échéance {deadline_type}"
+
+        messages.append({
+            "user_id": user_id,
+            "to": email,
+            "subject": subject,
+            "message": compiled.render({
+                "client_name": name,
+                "client_email": email,
+                "client_phone": "N/A",
+                "client_type": client_type or "N/A",
+                "ice": ice or "N/A",
+                "if_number": if_number or "N/A",
+                "deadline_type": deadline_type,
+                "period": period,
+                "due_date": due_date,
+                "status": "Pending"
+            }),
+            "deadline_ids": [deadline_id]
+        })
+    return messages, errors
+
+def queue_individual_emails(deadline_ids):
+    """Queue the email of each deadline in one outbox insert; returns (outbox ids, errors)."""
+    messages, errors = build_individual_emails(deadline_ids)
+    ids = outbox.enqueue_messages([{
+        "channel": "email",
+        "recipient": msg["to"],
+        "subject": msg["subject"],
+        "body": msg["message"],
+        "user_id": msg["user_id"],
+        "deadline_id": msg["deadline_ids"][0]
+    } for msg in messages])
+    return ids, errors
 
-    conn.commit()
-    conn.close()
+def process_today_deadlines():
+    result = roll_over_deadlines()
+    moved = ", ".join(f"{period}: {count}" for period, count in result["moved"].items())
+    print(f"🔁 Échéances reportées ({moved}), {result['deleted']} échéance(s) ponctuelle(s) supprimée(s)")
+    return result
 
 if __name__ == "__main__":
     print("🚀 Démarrage du job de rappel par email pour tous les utilisateurs approuvés")
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, username FROM users WHERE approved = TRUE")
-    users = c.fetchall()
-    conn.close()
-    print(f"👥 {len(users)} utilisateurs approuvés trouvés")
-
-    for user_id, username in users:
-        print(f"👤 Traitement de l'utilisateur: {username} (ID: {user_id})")
-        send_reminders(days_list=[20, 10, 5, 1], username=username)
+    plan = plan_reminders(days_list=DEFAULT_REMINDER_DAYS)
+    print(f"👥 {len({user_id for user_id, _, _ in plan})} utilisateurs avec des rappels à envoyer")
+    sent, failed = send_plan(plan)
+    print(f"📨 {sent} emails envoyés, {failed} échecs")
     process_today_deadlines()
-    print("🏁 Job de rappel par email terminé")
\ No newline at end of file
+    print("🏁 Job de rappel par email terminé")
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import tempfile
+from datetime import date
+from database import get_connection
+
+# Exports are built by export_worker.py; the Streamlit pages only queue jobs
+# and poll them. Finished files are stored under EXPORT_ARTIFACT_DIR by a
+# content hash, so an unchanged export is built once and served many times.
+EXPORT_ARTIFACT_DIR = os.getenv("EXPORT_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "deadline_exports"))
+# Artifacts unused for longer than this are pruned by the worker (seconds)
+EXPORT_ARTIFACT_TTL = float(os.getenv("EXPORT_ARTIFACT_TTL", str(7 * 24 * 3600)))
+
+JOB_COLUMNS = ["id", "user_id", "format", "horizon_months", "artifact_key", "status",
+               "total_rows", "progress_rows", "error", "created_at", "finished_at"]
+
+def data_fingerprint(user_id, conn):
+    """(row count, order-independent hash) of everything a user's export contains.
+
+    One aggregate over the user's deadlines: no rows are sent back, and any
+    change to an exported column changes the hash.
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT count(*),
+               COALESCE(sum(hashtextextended(concat_ws('|', d.id, d.type, d.period, d.due_date, d.status,
+                                                       d.email_sent, c.name, c.type), 0)), 0)
+        FROM deadlines d
+        JOIN clients c ON d.client_id = c.id
+        WHERE c.user_id = %s
+    """, (user_id,))
+    return c.fetchone()
+
+def artifact_key(user_id, fmt, horizon_months, fingerprint):
+    # Expanded occurrences depend on the current date as well
+    anchor = date.today().isoformat() if horizon_months else ""
+    raw = f"{user_id}:{fmt}:{horizon_months}:{anchor}:{fingerprint[0]}:{fingerprint[1]}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def artifact_path(key, fmt):
+    return os.path.join(EXPORT_ARTIFACT_DIR, f"{key}.{fmt}")
+
+def _fetch_job(c, job_id):
+    c.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM export_jobs WHERE id = %s", (job_id,))
+    row = c.fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+def request_export(user_id, fmt, horizon_months=0):
+    """Queue an export and return its job.
+
+    When the same data was already exported in this format, the job is
+    created as done and points at the cached file. An identical job still
+    pending or running is returned instead of queueing a second one.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    fingerprint = data_fingerprint(user_id, conn)
+    key = artifact_key(user_id, fmt, horizon_months, fingerprint)
+
+    if os.path.exists(artifact_path(key, fmt)):
+        # Refresh the mtime so the pruning TTL counts from the last use
+        os.utime(artifact_path(key, fmt))
+        c.execute("""
+            INSERT INTO export_jobs (user_id, format, horizon_months, artifact_key, status, total_rows, progress_rows, finished_at)
+            VALUES (%s, %s, %s, %s, 'done', %s, %s, CURRENT_TIMESTAMP)
+            RETURNING id
+        """, (user_id, fmt, horizon_months, key, fingerprint[0], fingerprint[0]))
+        job_id = c.fetchone()[0]
+    else:
+        c.execute("""
+            SELECT id FROM export_jobs
+            WHERE user_id = %s AND artifact_key = %s AND status IN ('pending', 'running')
+            ORDER BY id DESC LIMIT 1
+        """, (user_id, key))
+        row = c.fetchone()
+        if row:
+            job_id = row[0]
+        else:
+            c.execute("""
+                INSERT INTO export_jobs (user_id, format, horizon_months, artifact_key, total_rows)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id
+            """, (user_id, fmt, horizon_months, key, fingerprint[0]))
+            job_id = c.fetchone()[0]
+    job = _fetch_job(c, job_id)
+    conn.commit()
+    conn.close()
+    return job
+
+def get_job(job_id, user_id=None):
+    conn = get_connection()
+    c = conn.cursor()
+    job = _fetch_job(c, job_id)
+    conn.close()
+    if job and user_id is not None and job["user_id"] != user_id:
+        return None
+    return job
+
+def artifact_exists(job):
+    return os.path.exists(artifact_path(job["artifact_key"], job["format"]))
+
+def read_artifact(job):
+    """Bytes of the finished file of a done job, or None once it has been pruned.
+
+    st.download_button takes str, bytes or a file-like buffer, not the file
+    objects export_deadlines writes to, so the file is handed over as bytes.
+    """
+    path = artifact_path(job["artifact_key"], job["format"])
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,130 @@
+import argparse
+import os
+import time
+from database import get_connection
+import deadline_export
+import export_jobs
+
+EXPORT_POLL_INTERVAL = float(os.getenv("EXPORT_POLL_INTERVAL", "2"))
+# Jobs left 'running' longer than this belong to a crashed worker (seconds)
+EXPORT_LOCK_TIMEOUT = float(os.getenv("EXPORT_LOCK_TIMEOUT", "1800"))
+# Seconds between two passes removing expired artifacts
+EXPORT_PRUNE_INTERVAL = float(os.getenv("EXPORT_PRUNE_INTERVAL", "3600"))
+# Minimum seconds between two progress updates of a running job
+EXPORT_PROGRESS_INTERVAL = float(os.getenv("EXPORT_PROGRESS_INTERVAL", "1"))
+
+def claim_job():
+    """Lock the oldest pending export for this worker; SKIP LOCKED lets several workers run."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        UPDATE export_jobs
+        SET status = 'pending', locked_at = NULL
+        WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    """, (EXPORT_LOCK_TIMEOUT,))
+    c.execute("""
+        UPDATE export_jobs
+        SET status = 'running', locked_at = CURRENT_TIMESTAMP, progress_rows = 0
+        WHERE id = (
+            SELECT id FROM export_jobs
+            WHERE status = 'pending'
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, format, horizon_months, artifact_key
+    """)
+    row = c.fetchone()
+    conn.commit()
+    conn.close()
+    return dict(zip(["id", "user_id", "format", "horizon_months", "artifact_key"], row)) if row else None
+
+def _update_job(job_id, query, params):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(query, params + (job_id,))
+    conn.commit()
+    conn.close()
+
+def build_job(job):
+    """Build the job's file unless an identical artifact exists, then mark the job done or failed."""
+    path = export_jobs.artifact_path(job["artifact_key"], job["format"])
+    try:
+        if not os.path.exists(path):
+            os.makedirs(export_jobs.EXPORT_ARTIFACT_DIR, exist_ok=True)
+            last_update = 0.0
+
+            def progress(rows):
+                nonlocal last_update
+                if time.monotonic() - last_update >= EXPORT_PROGRESS_INTERVAL:
+                    last_update = time.monotonic()
+                    _update_job(job["id"], "UPDATE export_jobs SET progress_rows = %s, locked_at = CURRENT_TIMESTAMP WHERE id = %s", (rows,))
+
+            # Written under a temporary name and renamed, so readers never see a partial file
+            partial = f"{path}.{os.getpid()}.part"
+            try:
+                with open(partial, "wb") as out:
+                    deadline_export.export_deadlines(
+                        job["user_id"], job["format"], job["horizon_months"], out=out, progress=progress
+                    )
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        _update_job(job["id"], """
+            UPDATE export_jobs
+            SET status = 'done', progress_rows = total_rows, locked_at = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, ())
+        print(f"✅ Export {job['id']} prêt ({job['format']})")
+    except Exception as e:
+        _update_job(job["id"], """
+            UPDATE export_jobs
+            SET status = 'failed', error = %s, locked_at = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (str(e),))
+        print(f"❌ Export {job['id']} en échec: {e}")
+
+def prune_artifacts(ttl=export_jobs.EXPORT_ARTIFACT_TTL):
+    if not os.path.isdir(export_jobs.EXPORT_ARTIFACT_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - ttl
+    for entry in os.scandir(export_jobs.EXPORT_ARTIFACT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+def process_job():
+    job = claim_job()
+    if job:
+        build_job(job)
+    return job is not None
+
+def run(poll_interval=EXPORT_POLL_INTERVAL, once=False):
+    print("🚀 Démarrage du générateur d'exports")
+    last_prune = None
+    while True:
+        if last_prune is None or time.monotonic() - last_prune >= EXPORT_PRUNE_INTERVAL:
+            prune_artifacts()
+            last_prune = time.monotonic()
+        try:
+            if process_job():
+                continue
+        except Exception as e:
+            # Keep the in-app worker thread alive across database hiccups
+            if once:
+                raise
+            print(f"⚠️ Générateur d'exports: {e}")
+        if once:
+            break
+        time.sleep(poll_interval)
+    print("🏁 Aucun export en attente")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build queued deadline exports from export_jobs.")
+    parser.add_argument("--once", action="store_true", help="exit once no export is pending")
+    parser.add_argument("--poll-interval", type=float, default=EXPORT_POLL_INTERVAL)
+    args = parser.parse_args()
+    run(poll_interval=args.poll_interval, once=args.once)
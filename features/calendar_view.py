@@ -2,45 +2,94 @@
 
 import streamlit as st
 from streamlit_calendar import calendar
-from database import get_connection
+from database import get_connection, get_data_version
+from recurrence import PERIOD_MONTHS, expand_frame
+from datetime import date, timedelta
+import numpy as np
 import pandas as pd
 
-def show_calendar_view(user_id):
-    st.subheader("📅 Calendar View of Deadlines")
+# Cached months expire after this, so changes made outside this process show up
+CALENDAR_CACHE_TTL = 300
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
 
+@st.cache_data(ttl=CALENDAR_CACHE_TTL, max_entries=1000, show_spinner=False)
+def load_month_events(user_id, month, data_version):
+    """Calendar events of one user for the month starting at `month`.
+
+    data_version is only part of the cache key: bumping it invalidates the
+    user's cached months.
+    """
+    month_end = _add_months(month, 1)
     conn = get_connection()
+    # Recurring series that started before the month can still occur in it
     query = """
-        SELECT 
-            deadlines.id AS id,
+        SELECT
             clients.name AS client_name,
             deadlines.type AS deadline_type,
+            deadlines.period,
             deadlines.due_date,
             deadlines.status
         FROM deadlines
         JOIN clients ON deadlines.client_id = clients.id
-        WHERE clients.user_id = %s
+        WHERE clients.user_id = %(user_id)s AND deadlines.due_date < %(end)s
+          AND (deadlines.due_date >= %(start)s OR lower(deadlines.period) = ANY(%(periods)s))
     """
-    df = pd.read_sql(query, conn, params=(user_id,))
+    df = pd.read_sql(query, conn, params={
+        "user_id": user_id, "start": month, "end": month_end, "periods": list(PERIOD_MONTHS)
+    })
     conn.close()
 
+    df = expand_frame(df, month, month_end - timedelta(days=1))
     if df.empty:
-        st.info("No deadlines found.")
-        return
+        return []
+    # Only the stored occurrence has a status; projected ones are still to do
+    projected = df["occurrence_date"] != df["due_date"]
+    day = pd.to_datetime(df["occurrence_date"]).dt.strftime("%Y-%m-%d")
+    events = pd.DataFrame({
+        "title": df["client_name"] + " - " + df["deadline_type"],
+        "start": day,
+        "end": day,
+        "color": np.select(
+            [projected, df["status"] == "Pending"], ["#f5c26b", "#f39c12"], default="#2ecc71"
+        ),
+    })
+    return events.to_dict("records")
 
-    # Prepare calendar events
+def show_calendar_view(user_id):
+    st.subheader("📅 Calendar View of Deadlines")
+
+    # The visible month is kept in session state; the month grid also shows
+    # days of the adjacent months, which doubles as prefetching them.
+    today = date.today()
+    month = st.session_state.get("calendar_month", date(today.year, today.month, 1))
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        if st.button("◀ Mois précédent", key="calendar_prev"):
+            month = _add_months(month, -1)
+    with col2:
+        if st.button("Aujourd'hui", key="calendar_today"):
+            month = date(today.year, today.month, 1)
+    with col3:
+        if st.button("Mois suivant ▶", key="calendar_next"):
+            month = _add_months(month, 1)
+    st.session_state["calendar_month"] = month
+
+    data_version = get_data_version(user_id)
     events = []
-    for _, row in df.iterrows():
-        events.append({
-            "title": f"{row['client_name']} - {row['deadline_type']}",
-            "start": row['due_date'].strftime("%Y-%m-%d"),
-            "end": row['due_date'].strftime("%Y-%m-%d"),
-            "color": "#f39c12" if row['status'] == "Pending" else "#2ecc71"
-        })
+    for offset in (-1, 0, 1):
+        events += load_month_events(user_id, _add_months(month, offset), data_version)
+
+    if not events:
+        st.info("No deadlines found.")
 
     calendar_options = {
         "initialView": "dayGridMonth",
+        "initialDate": month.isoformat(),
         "headerToolbar": {
-            "left": "prev,next today",
+            "left": "",
             "center": "title",
             "right": "dayGridMonth,timeGridWeek"
         },
@@ -49,5 +98,4 @@ def show_calendar_view(user_id):
         "height": 650
     }
 
-    calendar(events=events, options=calendar_options)
-    
\ No newline at end of file
+    calendar(events=events, options=calendar_options, callbacks=[], key=f"calendar_{month.isoformat()}")
@@ -1,10 +1,13 @@
 import streamlit as st
-from database import get_connection
+from database import get_connection, bump_data_version, get_deadlines_page
 import pandas as pd
 import email_utils
+import client_import
+
+DEADLINE_PAGE_SIZES = [25, 50, 100]
 
 def show_client_deadline_manager(user_id):
-    tab = st.radio("Management:", ["Add Client", "Add Deadline", "View Deadlines"])
+    tab = st.radio("Management:", ["Add Client", "Add Deadline", "View Deadlines", "Import"])
 
     if tab == "Add Client":
         st.subheader("➕ Add New Client")
@@ -58,67 +61,114 @@ def show_client_deadline_manager(user_id):
                 """, (client_id, task_type, period, due_date.strftime("%Y-%m-%d"), status))
                 conn.commit()
                 conn.close()
+                bump_data_version(user_id)
                 st.success("✅ Échéance ajoutée avec succès !")
 
     elif tab == "View Deadlines":
         st.subheader("📋 All Client Deadlines")
-        conn = get_connection()
-        query = """
-            SELECT 
-                deadlines.id AS deadline_id,
-                clients.name AS client_name,
-                clients.type AS client_type,
-                deadlines.type AS deadline_type,
-                deadlines.period,
-                deadlines.due_date,
-                deadlines.status,
-                deadlines.email_sent
-            FROM deadlines
-            JOIN clients ON deadlines.client_id = clients.id
-            WHERE clients.user_id = %s
-            ORDER BY deadlines.due_date ASC
-        """
-        df = pd.read_sql_query(query, conn, params=(user_id,))
-        conn.close()
 
-        if df.empty:
+        # Filters and paging run in SQL; a page change only fetches page_size rows.
+        # deadline_cursors holds the (due_date, id) each visited page starts after.
+        def reset_pages():
+            st.session_state["deadline_cursors"] = [None]
+
+        with st.expander("🔍 Filter"):
+            search_name = st.text_input("Search by Client Name", key="deadline_search", on_change=reset_pages)
+            selected_status = st.selectbox("Filter by Status", ["All", "Pending", "Done"], key="deadline_status", on_change=reset_pages)
+            col1, col2 = st.columns(2)
+            with col1:
+                order = st.selectbox("Order", ["asc", "desc"], key="deadline_order", on_change=reset_pages,
+                                     format_func=lambda o: "Due date ↑" if o == "asc" else "Due date ↓")
+            with col2:
+                page_size = st.selectbox("Par page", DEADLINE_PAGE_SIZES, key="deadline_page_size", on_change=reset_pages)
+
+        cursors = st.session_state.setdefault("deadline_cursors", [None])
+        rows, has_next = get_deadlines_page(
+            user_id,
+            search=search_name,
+            status=None if selected_status == "All" else selected_status,
+            after=cursors[-1],
+            limit=page_size,
+            order=order
+        )
+
+        if not rows and len(cursors) == 1:
             st.info("Aucune échéance trouvée.")
         else:
-            with st.expander("🔍 Filter"):
-                search_name = st.text_input("Search by Client Name")
-                selected_status = st.selectbox("Filter by Status", ["All", "Pending", "Done"])
-
-                if search_name:
-                    df = df[df['client_name'].str.contains(search_name, case=False)]
-
-                if selected_status != "All":
-                    df = df[df['status'] == selected_status]
-
-                df["Statut Email"] = df["email_sent"].apply(lambda x: "Envoyé ✅" if x else "Non envoyé ❌")
+            df = pd.DataFrame(rows)
+            if not df.empty:
+                df["Statut Email"] = df["email_sent"].map({True: "Envoyé ✅"}).fillna("Non envoyé ❌")
                 df.drop(columns=["email_sent"], inplace=True)
-
             st.dataframe(df, use_container_width=True, hide_index=True)
 
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("◀ Précédent", disabled=len(cursors) == 1, key="deadline_prev_page"):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {len(cursors)}")
+            with col3:
+                if st.button("Suivant ▶", disabled=not has_next, key="deadline_next_page"):
+                    cursors.append((rows[-1]["due_date"], rows[-1]["deadline_id"]))
+                    st.rerun()
+
+            deadline_ids = [row["deadline_id"] for row in rows]
+
             with st.expander("🗑️ Delete a Deadline"):
-                deadline_ids = df["deadline_id"].tolist()
                 to_delete = st.selectbox("Select deadline ID to delete", deadline_ids)
 
-                if st.button("Delete Deadline"):
+                if st.button("Delete Deadline") and to_delete is not None:
                     conn = get_connection()
                     c = conn.cursor()
                     c.execute("DELETE FROM deadlines WHERE id = %s", (to_delete,))
                     conn.commit()
                     conn.close()
+                    bump_data_version(user_id)
                     st.success("Échéance supprimée.")
                     st.rerun()
 
-            with st.expander("✉️ Send Individual Email"):
-                deadline_ids = df["deadline_id"].tolist()
-                to_email_id = st.selectbox("Select deadline ID to send email", deadline_ids, key="send_email_id")
-
-                if st.button("Send Individual Email"):
-                    try:
-                        email_utils.send_individual_email(to_email_id)
-                        st.success(f"Email envoyé pour l'échéance ID {to_email_id}.")
-                    except Exception as e:
-                        st.error(f"Échec de l'envoi de l'email: {e}")
\ No newline at end of file
+            with st.expander("✉️ Send Individual Emails"):
+                with st.form("send_individual_emails"):
+                    to_email_ids = st.multiselect("Select deadline IDs to send email", deadline_ids, key="send_email_ids")
+                    if st.form_submit_button("Send Individual Emails") and to_email_ids:
+                        try:
+                            queued, errors = email_utils.queue_individual_emails(to_email_ids)
+                            if queued:
+                                st.success(f"{len(queued)} email(s) mis en file d'envoi.")
+                            for deadline_id, error in errors.items():
+                                st.error(f"Échéance ID {deadline_id}: {error}")
+                        except Exception as e:
+                            st.error(f"Échec de l'envoi de l'email: {e}")
+
+    elif tab == "Import":
+        st.subheader("📥 Import Clients & Deadlines")
+        st.caption(
+            "Fichier CSV ou Excel, une ligne par client ou par échéance d'un client. Les clients sont "
+            "identifiés par leur ICE : un ICE déjà connu reçoit les échéances sans créer de doublon."
+        )
+        st.download_button("📄 Modèle CSV", client_import.template_csv(), file_name="modele_import.csv", mime="text/csv")
+        uploaded = st.file_uploader("Fichier à importer", type=["csv", "xlsx"])
+
+        if uploaded is not None and st.button("Importer"):
+            try:
+                with st.spinner("Import en cours..."):
+                    result = client_import.import_file(user_id, uploaded, uploaded.name)
+            except Exception as e:
+                st.error(f"Échec de l'import: {e}")
+            else:
+                st.success(
+                    f"✅ {result['valid']}/{result['rows']} lignes importées : "
+                    f"{result['clients_created']} clients créés ({result['clients_existing']} déjà existants), "
+                    f"{result['deadlines_created']} échéances ajoutées ({result['deadlines_skipped']} doublons ignorés)."
+                )
+                errors = result["errors"]
+                if not errors.empty:
+                    st.warning(f"⚠️ {errors['line'].nunique()} lignes rejetées")
+                    st.dataframe(errors, use_container_width=True, hide_index=True)
+                    st.download_button(
+                        "📄 Télécharger le rapport d'erreurs",
+                        errors.to_csv(index=False),
+                        file_name="erreurs_import.csv",
+                        mime="text/csv"
+                    )
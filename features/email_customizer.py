@@ -1,8 +1,6 @@
 import streamlit as st
 from database import get_connection
-import email_utils
-import SMS_utils
-from datetime import datetime, timedelta
+from template_engine import TEMPLATE_VARIABLES, validate_template
 import streamlit.components.v1 as components
 import time
 
@@ -10,11 +8,7 @@ def show_email_customizer(user_id):
     st.subheader("✉️ Customize Email and SMS Reminders")
 
     # Available variables
-    available_variables = [
-        "{client_name}", "{client_email}", "{client_phone}", "{client_type}",
-        "{ice}", "{if_number}", "{deadline_type}", "{period}", "{due_date}",
-        "{status}"
-    ]
+    available_variables = ["{" + name + "}" for name in TEMPLATE_VARIABLES]
 
     # Initialize session state
     if 'email_message_template' not in st.session_state:
@@ -191,12 +185,23 @@ def show_email_customizer(user_id):
         )
 
         # Submit button
-        submit_button = st.form_submit_button("Send and Save Template")
+        submit_button = st.form_submit_button("Save Template")
         if submit_button:
             if not email_message_template.strip() and not sms_message_template.strip():
                 st.error("At least one message template (Email or SMS) must not be empty.")
                 return
 
+            # Check the variables before saving, not row by row when sending
+            invalid = [
+                f"{label}: {error}"
+                for label, text in (("Email", email_message_template), ("SMS", sms_message_template))
+                if text.strip() and (error := validate_template(text))
+            ]
+            if invalid:
+                for error in invalid:
+                    st.error(f"Invalid message template — {error}")
+                return
+
             # Save template to database
             conn = get_connection()
             c = conn.cursor()
@@ -214,104 +219,7 @@ def show_email_customizer(user_id):
             ))
             conn.commit()
             conn.close()
+            # Reminders are sent by the daily planner (email_utils.plan_reminders), not on save
             st.success("Template saved successfully.")
             time.sleep(1)
             st.rerun()  # Rerun to clear form fields
-            # Send emails and SMS
-            query = """
-                SELECT c.name, c.email, c.phone, c.type, c.ice, c.if_number,
-                       d.type AS deadline_type, d.period, d.due_date, d.status,
-                       d.email_sent, d.sms_sent, d.id AS deadline_id
-                FROM deadlines d
-                JOIN clients c ON d.client_id = c.id
-                WHERE d.status = 'Pending' AND c.user_id = %s
-            """
-            params = [user_id]
-            if selected_deadline_type != "All":
-                query += " AND d.type = %s"
-                params.append(selected_deadline_type)
-            if client_dict[selected_client]:
-                query += " AND c.id = %s"
-                params.append(client_dict[selected_client])
-            if days_before > 0:
-                reminder_date = (datetime.now() + timedelta(days=days_before)).strftime("%Y-%m-%d")
-                query += " AND d.due_date = %s"
-                params.append(reminder_date)
-
-            conn = get_connection()
-            c = conn.cursor()
-            c.execute(query, params)
-            rows = c.fetchall()
-            conn.close()
-
-            if not rows:
-                st.warning("No matching deadlines found for the selected criteria.")
-                return
-
-            for row in rows:
-                client_name, client_email, client_phone, client_type, ice, if_number, deadline_type, period, due_date, status, email_sent, sms_sent, deadline_id = row
-                
-                try:
-                    email_message = email_message_template.format(
-                        client_name=client_name,
-                        client_email=client_email,
-                        client_phone=client_phone or "N/A",
-                        client_type=client_type or "N/A",
-                        ice=ice or "N/A",
-                        if_number=if_number or "N/A",
-                        deadline_type=deadline_type,
-                        period=period,
-                        due_date=due_date,
-                        status=status
-                    ) if email_message_template.strip() else None
-                    
-                    sms_message = sms_message_template.format(
-                        client_name=client_name,
-                        client_email=client_email,
-                        client_phone=client_phone or "N/A",
-                        client_type=client_type or "N/A",
-                        ice=ice or "N/A",
-                        if_number=if_number or "N/A",
-                        deadline_type=deadline_type,
-                        period=period,
-                        due_date=due_date,
-                        status=status
-                    ) if sms_message_template.strip() else None
-                except KeyError as e:
-                    st.error(f"Invalid variable in message template: {e}")
-                    continue
-
-                if email_message and email_utils.is_valid_email(client_email):
-                    try:
-                        email_utils.send_email(client_email, subject, email_message)
-                        email_utils.log_email_sent(user_id, deadline_id)
-                        conn = get_connection()
-                        c = conn.cursor()
-                        c.execute("UPDATE deadlines SET email_sent = TRUE WHERE id = %s", (deadline_id,))
-                        conn.commit()
-                        conn.close()
-                        st.success(f"Email sent to {client_name} ({client_email})")
-                    except Exception as e:
-                        st.error(f"Failed to send email to {client_email}: {e}")
-
-                if sms_message and client_phone:
-                    if client_phone.startswith("0"):
-                        client_phone = "+212" + client_phone[1:]
-                    if client_phone.startswith("+"):
-                        try:
-                            SMS_utils.send_sms(client_phone, sms_message)
-                            conn = get_connection()
-                            c = conn.cursor()
-                            c.execute(
-                                "INSERT INTO sms_logs (user_id, deadline_id, phone, message) VALUES (%s, %s, %s, %s)",
-                                (user_id, deadline_id, client_phone, sms_message)
-                            )
-                            c.execute("UPDATE deadlines SET sms_sent = TRUE WHERE id = %s", (deadline_id,))
-                            conn.commit()
-                            conn.close()
-                            st.success(f"SMS sent to {client_name} ({client_phone})")
-                        except Exception as e:
-                            st.error(f"Failed to send SMS to {client_phone}: {e}")
-                    else:
-                        st.warning(f"Skipping invalid phone: {client_phone}")
-            st.success("All reminders processed.")
\ No newline at end of file
@@ -1,39 +1,72 @@
+import os
+import threading
 import streamlit as st
-import pandas as pd
-import io
-from database import get_connection
+import deadline_export
+import export_jobs
+
+# Months of upcoming occurrences that can be added to the export
+EXPORT_HORIZONS = {"Aucune": 0, "3 mois": 3, "6 mois": 6, "12 mois": 12}
+FORMAT_LABELS = {"xlsx": "Excel", "csv": "CSV", "parquet": "Parquet"}
+# Set to 0 when exports are built by a separate `python export_worker.py`
+EXPORT_WORKER_IN_APP = os.getenv("EXPORT_WORKER_IN_APP", "1") == "1"
+EXPORT_POLL_SECONDS = 1
+
+@st.cache_resource(show_spinner=False)
+def start_export_worker():
+    # One background builder per Streamlit process
+    import export_worker
+    thread = threading.Thread(target=export_worker.run, name="export-worker", daemon=True)
+    thread.start()
+    return thread
 
 def show_export_deadlines(user_id):
     st.subheader("📤 Export My Deadlines")
-    if st.button("📥 Export Deadlines to Excel"):
-        conn = get_connection()
-        query = """
-            SELECT 
-                d.id AS ID,
-                c.name AS Client,
-                c.type AS Type_Client,
-                d.type AS Type_Échéance,
-                d.period AS Période,
-                d.due_date AS "Date_d'échéance",
-                d.status AS Statut,
-                CASE WHEN d.email_sent THEN 'Envoyé' ELSE 'Non envoyé' END AS "Email_Envoyé"
-            FROM deadlines d
-            JOIN clients c ON d.client_id = c.id
-            WHERE c.user_id = %s
-            ORDER BY d.due_date ASC
-        """
-        df = pd.read_sql(query, conn, params=(user_id,))
-        conn.close()
-
-        if df.empty:
+    if EXPORT_WORKER_IN_APP:
+        start_export_worker()
+
+    horizon = st.selectbox("Inclure les occurrences à venir des échéances récurrentes", list(EXPORT_HORIZONS))
+    fmt = st.radio("Format", deadline_export.available_formats(), format_func=FORMAT_LABELS.get, horizontal=True)
+
+    if st.button(f"📥 Préparer l'export {FORMAT_LABELS[fmt]}"):
+        job = export_jobs.request_export(user_id, fmt, EXPORT_HORIZONS[horizon])
+        st.session_state["export_job_id"] = job["id"]
+
+    job_id = st.session_state.get("export_job_id")
+    job = export_jobs.get_job(job_id, user_id) if job_id else None
+    if job is None:
+        return
+
+    # Poll while the job is queued or running; a full rerun stops the polling
+    active = job["status"] in ("pending", "running")
+
+    @st.fragment(run_every=EXPORT_POLL_SECONDS if active else None)
+    def show_job():
+        current = export_jobs.get_job(job_id, user_id)
+        if current["status"] == "pending":
+            st.info("⏳ Export en file d'attente...")
+        elif current["status"] == "running":
+            total = current["total_rows"] or 0
+            done = min(current["progress_rows"], total)
+            st.progress(done / total if total else 0.0, text=f"Export en cours : {done}/{total} échéances")
+        if active and current["status"] not in ("pending", "running"):
+            st.rerun()
+
+    show_job()
+
+    if job["status"] == "failed":
+        st.error(f"Échec de l'export: {job['error']}")
+    elif job["status"] == "done":
+        if not job["total_rows"]:
             st.warning("Aucune échéance à exporter.")
-        else:
-            towrite = io.BytesIO()
-            df.to_excel(towrite, index=False, sheet_name="Mes Échéances")
-            towrite.seek(0)
-            st.download_button(
-                label="📄 Download Excel",
-                data=towrite,
-                file_name="mes_echeances.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
\ No newline at end of file
+            return
+        if not export_jobs.artifact_exists(job):
+            st.warning("Ce fichier a expiré, préparez un nouvel export.")
+            return
+        file_name, mime = deadline_export.EXPORT_FORMATS[job["format"]]
+        # Read only when the button is clicked, not on every rerun
+        st.download_button(
+            label=f"📄 Télécharger ({job['total_rows']} échéances)",
+            data=lambda: export_jobs.read_artifact(job) or b"",
+            file_name=file_name,
+            mime=mime
+        )
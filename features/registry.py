@@ -0,0 +1,38 @@
+import importlib
+
+# Menu label -> (module, show function, takes user_id). Modules are imported
+# only when their menu item is opened, so the login page never pays for
+# pandas, openpyxl, Twilio or streamlit_calendar.
+FEATURES = {
+    "Accounting Notes": ("features.notes", "show_notes", True),
+    "Invoice Calculator (Excl. VAT ➜ Incl. VAT)": ("features.invoice_calculator", "show_invoice_calculator", False),
+    "Export My Deadlines": ("features.export_deadlines", "show_export_deadlines", True),
+    "VAT Calculator": ("features.tva_calculator", "show_tva_calculator", False),
+    "Client & Deadline Management": ("features.client_deadline_manager", "show_client_deadline_manager", True),
+    "Calendar View": ("features.calendar_view", "show_calendar_view", True),
+    "Customize Email": ("features.email_customizer", "show_email_customizer", True),
+}
+
+ADMIN_FEATURES = {
+    "Admin Panel": ("admin_panel", "show_admin_panel", False),
+}
+
+def menu_items(is_admin=False):
+    items = list(FEATURES)
+    if is_admin:
+        items += list(ADMIN_FEATURES)
+    return items
+
+def load_feature(name):
+    module_name, function_name, _ = FEATURES.get(name) or ADMIN_FEATURES[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+def show_feature(name, user_id, is_admin=False):
+    entry = FEATURES.get(name) or (ADMIN_FEATURES.get(name) if is_admin else None)
+    if entry is None:
+        return
+    show = load_feature(name)
+    if entry[2]:
+        show(user_id)
+    else:
+        show()
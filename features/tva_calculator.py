@@ -1,120 +1,67 @@
 import streamlit as st
 import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from datetime import datetime
+from tva_report import (
+    LINE_COLUMNS, ROLES, DEFAULT_TVA_RATE, compute_ht_tva, prepare_lines, read_lines, write_tva_report
+)
 
 # Logic for calculating HT and TVA
 def calculate_ht_tva(ttc, tva_rate):
-    ht = round(ttc / (1 + tva_rate / 100), 2)
-    tva = round(ttc - ht, 2)
-    return ht, tva
+    ht, tva = compute_ht_tva([ttc], [tva_rate])
+    return float(ht[0]), float(tva[0])
 
 # Function to export DataFrame to Excel in memory
 def export_to_excel(df, enterprise_name, date_str):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Rapport TVA"
-
-    for i in range(1, 100):
-        ws.row_dimensions[i].height = 22
-    for col in range(2, 7):
-        ws.column_dimensions[chr(64 + col)].width = 18
-
-    bold = Font(bold=True)
-    center = Alignment(horizontal="center")
-    border = Border(left=Side(style="thin"), right=Side(style="thin"),
-                    top=Side(style="thin"), bottom=Side(style="thin"))
-    grey_fill = PatternFill(start_color='C0C0C0', end_color='C0C0C0', fill_type='solid')
-    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-
-    def write_section(start_row, title, data, is_client, first_col_header):
-        ws.merge_cells(start_row=start_row, start_column=2, end_row=start_row, end_column=6)
-        ws.cell(row=start_row, column=2).value = title
-        ws.cell(row=start_row, column=2).font = Font(bold=True, size=12)
-        ws.cell(row=start_row, column=2).alignment = center
-
-        headers = [first_col_header, "MT TTC", "M. H.T", "Taux TVA", "TVA"]
-        for col_num, header in enumerate(headers, 2):
-            cell = ws.cell(row=start_row + 1, column=col_num)
-            cell.value = header
-            cell.font = bold
-            cell.alignment = center
-            cell.border = border
-
-        tva_total = 0
-        for i, row in enumerate(data, start=start_row + 2):
-            for j, key in enumerate(["Service", "TTC", "HT", "TVA Rate", "TVA"], 2):
-                cell = ws.cell(row=i, column=j)
-                if key == "TVA Rate":
-                    cell.value = f"{row[key]}%"
-                    cell.fill = grey_fill
-                else:
-                    cell.value = row[key]
-                cell.border = border
-                cell.font = Font(bold=True, size=12)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                if key == "TVA":
-                    tva_total += row[key]
-                if row['Service'] == "Crédit Précédent":
-                    cell.fill = red_fill
-                elif row['Service'].upper().startswith("FAC"):
-                    cell.fill = yellow_fill
-                elif row['Service'].upper().startswith("FACTURE"):
-                    cell.fill = red_fill
-
-        total_row = start_row + 2 + len(data)
-        ws.merge_cells(start_row=total_row, start_column=2, end_row=total_row, end_column=5)
-        ws.cell(row=total_row, column=2).value = "la somme de TVA"
-        ws.cell(row=total_row, column=2).fill = green_fill
-        ws.cell(row=total_row, column=2).font = bold
-        ws.cell(row=total_row, column=2).alignment = center
-        ws.cell(row=total_row, column=6).value = round(tva_total, 2)
-        ws.cell(row=total_row, column=6).font = bold
-        ws.cell(row=total_row, column=6).fill = green_fill
-
-        return tva_total, total_row
-
-    clients = df[df['Role'] == 'Client'].to_dict(orient='records')
-    fournisseurs = df[df['Role'] == 'Fournisseur'].to_dict(orient='records')
-
-    credit_precedent_entries = [f for f in fournisseurs if f.get("Service") == "Crédit Précédent"]
-    other_fournisseurs = [f for f in fournisseurs if f.get("Service") != "Crédit Précédent"]
-    fournisseurs = other_fournisseurs + credit_precedent_entries
-
-    start_row_clients = 3
-    ca_title = f"C.A du {date_str}  {enterprise_name}"
-    tva_client, end_row_clients = write_section(
-        start_row_clients, ca_title, clients, is_client=True, first_col_header="Ventes")
-
-    ws.cell(row=end_row_clients + 1, column=2).value = "Nombre de Facture"
-    ws.cell(row=end_row_clients + 1, column=3).value = len(clients)
-    ws.cell(row=end_row_clients + 1, column=2).font = bold
-    ws.cell(row=end_row_clients + 1, column=2).fill = green_fill
-    ws.cell(row=end_row_clients + 1, column=3).font = bold
-    ws.cell(row=end_row_clients + 1, column=3).fill = green_fill
-
-    start_row_fournisseurs = end_row_clients + 3
-    tva_title = f"TVA RECUPERABLE le {date_str}"
-    tva_fournisseur, end_row_fournisseurs = write_section(
-        start_row_fournisseurs, tva_title, fournisseurs, is_client=False, first_col_header="Achats")
-
-    final_row = end_row_fournisseurs + 3
-    ws.merge_cells(start_row=final_row, start_column=2, end_row=final_row, end_column=5)
-    ws.cell(row=final_row, column=2).value = "TVA DUE"
-    ws.cell(row=final_row, column=2).font = Font(bold=True, color="FF0000")
-    ws.cell(row=final_row, column=2).fill = red_fill
-    ws.cell(row=final_row, column=2).alignment = center
-    ws.cell(row=final_row, column=6).value = round(tva_client - tva_fournisseur, 2)
-    ws.cell(row=final_row, column=6).font = Font(bold=True)
-
-    towrite = io.BytesIO()
-    wb.save(towrite)
-    towrite.seek(0)
-    return towrite
+    return write_tva_report(df, enterprise_name, date_str)
+
+def get_lines():
+    if 'tva_lines' not in st.session_state:
+        st.session_state['tva_lines'] = pd.DataFrame(columns=LINE_COLUMNS).astype(
+            {"TTC": float, "HT": float, "TVA Rate": float, "TVA": float})
+    return st.session_state['tva_lines']
+
+def add_lines(lines):
+    st.session_state['tva_lines'] = pd.concat([get_lines(), lines], ignore_index=True)
+
+def add_batch(df):
+    lines, errors = prepare_lines(df, first_number=len(get_lines()) + 1)
+    add_lines(lines)
+    st.session_state['tva_batch_result'] = (len(lines), errors)
+
+def apply_grid_edits(edited):
+    """Store the edited grid with HT and TVA recomputed for every line at once."""
+    edited = edited.reset_index(drop=True)
+    edited["Role"] = edited["Role"].fillna("Client")
+    edited["Service"] = edited["Service"].fillna("")
+    edited["TVA Rate"] = edited["TVA Rate"].fillna(DEFAULT_TVA_RATE)
+    edited["HT"], edited["TVA"] = compute_ht_tva(edited["TTC"], edited["TVA Rate"])
+    st.session_state['tva_lines'] = edited[LINE_COLUMNS]
+
+def show_batch_entry():
+    with st.expander("📋 Batch entry"):
+        st.caption("One line per invoice: Type, Service, Total Incl. VAT, VAT Rate %. "
+                   "Lines copied from a spreadsheet can be pasted as they are; a header row is optional.")
+        paste_tab, upload_tab = st.tabs(["Paste", "Upload"])
+        with paste_tab:
+            with st.form("paste_form", clear_on_submit=True):
+                pasted = st.text_area("Invoice lines", height=150,
+                                      placeholder="Client\tFAC 12\t1200,00\t20\nFournisseur\t\t540\t20")
+                if st.form_submit_button("Add pasted lines") and pasted.strip():
+                    add_batch(read_lines(pasted))
+        with upload_tab:
+            uploaded = st.file_uploader("CSV or Excel file", type=["csv", "xlsx"], key="tva_upload")
+            if uploaded is not None and st.button("Add file lines"):
+                try:
+                    add_batch(read_lines(uploaded.getvalue(), uploaded.name))
+                except ValueError as e:
+                    st.error(f"❌ Unreadable file: {e}")
+
+        if 'tva_batch_result' in st.session_state:
+            added, errors = st.session_state.pop('tva_batch_result')
+            st.success(f"✅ {added} line(s) added")
+            if not errors.empty:
+                st.warning(f"⚠️ {len(errors)} line(s) ignored")
+                st.dataframe(errors, hide_index=True)
 
 # 🔄 Now the main UI logic in a function
 def show_tva_calculator():
@@ -123,9 +70,6 @@ def show_tva_calculator():
     enterprise_name = st.text_input("Company Name")
     date_str = st.text_input("Date (MM/YYYY)", value="07/2025")
 
-    if 'entries' not in st.session_state:
-        st.session_state['entries'] = []
-
     with st.form("add_form"):
         col1, col2 = st.columns(2)
         with col1:
@@ -143,36 +87,48 @@ def show_tva_calculator():
             else:
                 role_to_save = role
                 if not service.strip():
-                    next_id = len(st.session_state['entries']) + 1
+                    next_id = len(get_lines()) + 1
                     service = f"Facture {next_id}" if role == "Fournisseur" else f"Service {next_id}"
             ht, tva = calculate_ht_tva(ttc, tva_rate)
-            st.session_state['entries'].append({
+            add_lines(pd.DataFrame([{
                 "Role": role_to_save,
                 "Service": service,
                 "TTC": ttc,
                 "HT": ht,
                 "TVA Rate": tva_rate,
                 "TVA": tva
-            })
-
-    if st.session_state['entries']:
-        df = pd.DataFrame(st.session_state['entries'])
-        cols = st.columns(len(df.columns) + 1)
-        cols[0].write("")
-        for i, col_name in enumerate(df.columns):
-            cols[i + 1].write(f"**{col_name}**")
-        for idx, row in df.iterrows():
-            cols = st.columns(len(df.columns) + 1)
-            if cols[0].button("❌", key=f"del_{idx}"):
-                st.session_state['entries'].pop(idx)
-                st.rerun()
-            for i, value in enumerate(row):
-                cols[i + 1].write(value)
+            }]))
+
+    show_batch_entry()
+
+    df = get_lines()
+    if not df.empty:
+        # One grid for every line; rows are edited, added or deleted in place
+        edited = st.data_editor(
+            df,
+            key="tva_grid",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Role": st.column_config.SelectboxColumn("Role", options=ROLES, required=True),
+                "TTC": st.column_config.NumberColumn("TTC", min_value=0.0, step=0.01, format="%.2f"),
+                "HT": st.column_config.NumberColumn("HT", format="%.2f", disabled=True),
+                "TVA Rate": st.column_config.NumberColumn("TVA Rate", min_value=0.0, max_value=100.0, format="%.2f %%"),
+                "TVA": st.column_config.NumberColumn("TVA", format="%.2f", disabled=True),
+            },
+        )
+        grid_state = st.session_state.get("tva_grid", {})
+        if any(grid_state.get(change) for change in ("edited_rows", "added_rows", "deleted_rows")):
+            apply_grid_edits(edited)
+            st.rerun()
+
+        lines = df.dropna(subset=["TTC"])
 
         if st.button("📤 Export to Excel"):
             current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"rapport_tva_{enterprise_name or 'rapport'}_{current_time}.xlsx"
-            towrite = export_to_excel(df, enterprise_name, date_str)
+            towrite = export_to_excel(lines, enterprise_name, date_str)
             st.download_button(
                 label="📄 Download Excel",
                 data=towrite,
@@ -182,5 +138,5 @@ def show_tva_calculator():
             st.success("✅ Excel file ready to download!")
 
     if st.button("🔁 Reset"):
-        st.session_state['entries'] = []
-        st.rerun()
\ No newline at end of file
+        st.session_state.pop('tva_lines', None)
+        st.rerun()
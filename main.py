@@ -1,29 +1,46 @@
 import streamlit as st
-from database import init_db, get_connection
-from auth import init_auth, save_user_to_db, get_user_id, custom_login
+from database import init_db
+from migrations import LATEST_VERSION
+from auth import (
+    init_auth, save_user_to_db, custom_login, load_identity, admin_identity,
+    get_session_identity, set_session_identity, clear_session_identity
+)
 from dotenv import load_dotenv
 import os
-from admin_panel import show_admin_panel
+import threading
 from streamlit_cookies_manager import EncryptedCookieManager
-from features.tva_calculator import show_tva_calculator
-from features.calendar_view import show_calendar_view
-from features.email_customizer import show_email_customizer
-from features.notes import show_notes
-from features.invoice_calculator import show_invoice_calculator
-from features.export_deadlines import show_export_deadlines
-from features.client_deadline_manager import show_client_deadline_manager
+from features.registry import menu_items as feature_menu_items, show_feature
 import footer
 
 load_dotenv()
 
 COOKIE_PASSWORD = os.getenv("COOKIE_PASSWORD")
+# Set to 0 when the outbox is drained by a separate `python outbox_sender.py`
+OUTBOX_SENDER_IN_APP = os.getenv("OUTBOX_SENDER_IN_APP", "1") == "1"
 
 cookies = EncryptedCookieManager(prefix="deadline_calendar_", password=COOKIE_PASSWORD)
 
 if not cookies.ready():
     st.stop()
 
-init_db()
+# Schema bootstrap runs once per process and schema version, not on every rerun
+@st.cache_resource(show_spinner=False)
+def bootstrap_schema(schema_version):
+    return init_db()
+
+bootstrap_schema(LATEST_VERSION)
+
+@st.cache_resource(show_spinner=False)
+def start_outbox_sender():
+    # One background sender per Streamlit process, so queued emails and SMS leave within seconds
+    import outbox_sender
+    thread = threading.Thread(target=outbox_sender.run, name="outbox-sender", daemon=True)
+    thread.start()
+    return thread
+
+if OUTBOX_SENDER_IN_APP:
+    start_outbox_sender()
+
 st.set_page_config("📅 ComptaPilot")
 st.title("📅 ComptaPilot")
 
@@ -35,26 +52,21 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 ADMIN_NAME = os.getenv("MY_NAME")
 
-# Token logic
-if "auth_token" in cookies and cookies["auth_token"]:
-    token = cookies["auth_token"]
-    if token == "admin_token":
-        st.session_state['authentication_status'] = True
-        st.session_state['is_admin'] = True
-        st.session_state['name'] = ADMIN_NAME
-        st.session_state['username'] = ADMIN_USERNAME
-    else:
-        st.session_state['authentication_status'] = True
-        st.session_state['is_admin'] = False
-        st.session_state['username'] = token
-        # ✅ Fetch full name from DB and set it
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT name FROM users WHERE username = %s", (token,))
-        row = c.fetchone()
-        conn.close()
-        st.session_state['name'] = row[0] if row else token  # fallback to username if no match
-else:
+# Token logic: the identity is resolved once per session, then reused on every rerun
+if get_session_identity() is None:
+    clear_session_identity()
+    if "auth_token" in cookies and cookies["auth_token"]:
+        token = cookies["auth_token"]
+        if token == "admin_token":
+            identity = admin_identity(ADMIN_USERNAME, ADMIN_NAME)
+        else:
+            identity = load_identity(token)
+        if identity:
+            set_session_identity(identity)
+        else:
+            # The user was deleted or is no longer approved
+            cookies["auth_token"] = ""
+            cookies.save()
     if 'authentication_status' not in st.session_state:
         st.session_state['authentication_status'] = None
 
@@ -76,22 +88,16 @@ if st.session_state['authentication_status'] is None:
                 if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
                     cookies["auth_token"] = "admin_token"
                     cookies.save()
-                    st.session_state['authentication_status'] = True
-                    st.session_state['is_admin'] = True
-                    st.session_state['name'] = ADMIN_NAME
-                    st.session_state['username'] = username
+                    set_session_identity(admin_identity(username, ADMIN_NAME))
                     st.success("👑 Logged in as Admin")
                     st.rerun()
                 else:
-                    username_db, name = custom_login(username, password)
-                    if username_db:
-                        cookies["auth_token"] = username_db
+                    identity = custom_login(username, password)
+                    if identity:
+                        cookies["auth_token"] = identity["username"]
                         cookies.save()
-                        st.session_state['authentication_status'] = True
-                        st.session_state['is_admin'] = False
-                        st.session_state['name'] = name
-                        st.session_state['username'] = username_db
-                        st.success(f"Welcome {name}")
+                        set_session_identity(identity)
+                        st.success(f"Welcome {identity['name']}")
                         st.rerun()
                     else:
                         st.error("Username or password is incorrect")
@@ -117,7 +123,7 @@ if st.session_state['authentication_status'] is None:
 
 else:
     # Main logged-in interface
-    user_id = get_user_id(st.session_state['username'])
+    user_id = st.session_state['identity']['id']
 
     # Page config
     st.set_page_config(page_title="ComptaPilot", layout="wide")
@@ -126,18 +132,7 @@ else:
     if "feature" not in st.session_state:
         st.session_state["feature"] = "Accounting Notes"
 
-    menu_items = [
-        "Accounting Notes",
-        "Invoice Calculator (Excl. VAT ➜ Incl. VAT)",
-        "Export My Deadlines",
-        "VAT Calculator",
-        "Client & Deadline Management",
-        "Calendar View",
-        "Customize Email"
-    ]
-
-    if st.session_state.get("is_admin"):
-        menu_items.append("Admin Panel")
+    menu_items = feature_menu_items(is_admin=st.session_state.get("is_admin", False))
 
     # Sidebar styling
     st.markdown("""
@@ -199,27 +194,10 @@ else:
     if st.sidebar.button("🔓 Logout"):
         cookies["auth_token"] = ""
         cookies.save()
-        for key in ["authentication_status", "is_admin", "name", "username"]:
-            if key in st.session_state:
-                del st.session_state[key]
+        clear_session_identity()
         st.rerun()
 
-    # Feature views
-    if feature == "Accounting Notes":
-        show_notes(user_id)
-    elif feature == "Invoice Calculator (Excl. VAT ➜ Incl. VAT)":
-        show_invoice_calculator()
-    elif feature == "Export My Deadlines":
-        show_export_deadlines(user_id)
-    elif feature == "VAT Calculator":
-        show_tva_calculator()
-    elif feature == "Client & Deadline Management":
-        show_client_deadline_manager(user_id)
-    elif feature == "Calendar View":
-        show_calendar_view(user_id)
-    elif feature == "Customize Email":
-        show_email_customizer(user_id)
-    elif feature == "Admin Panel" and st.session_state['is_admin']:
-        show_admin_panel()
+    # Feature views (each module is imported on first use)
+    show_feature(feature, user_id, is_admin=st.session_state.get("is_admin", False))
 
 footer.footer()
\ No newline at end of file
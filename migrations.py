@@ -0,0 +1,226 @@
+# Versioned schema migrations applied by database.init_db().
+#
+# Each entry is (version, description, statements). Versions are applied in
+# order, once, and recorded in schema_migrations. Never edit a migration that
+# has been released; append a new one instead.
+
+# Secondary indexes for the reminder planner, calendar, notes, templates and
+# rollover queries; benchmarks/query_plans.py compares plans with and without them.
+HOT_PATH_INDEXES = [
+    ("idx_clients_user_id", "CREATE INDEX IF NOT EXISTS idx_clients_user_id ON clients (user_id)"),
+    ("idx_deadlines_client_due", "CREATE INDEX IF NOT EXISTS idx_deadlines_client_due ON deadlines (client_id, due_date)"),
+    ("idx_deadlines_due_date", "CREATE INDEX IF NOT EXISTS idx_deadlines_due_date ON deadlines (due_date)"),
+    ("idx_deadlines_pending_due",
+     "CREATE INDEX IF NOT EXISTS idx_deadlines_pending_due ON deadlines (due_date, client_id) WHERE status = 'Pending'"),
+    ("idx_message_templates_user_id", "CREATE INDEX IF NOT EXISTS idx_message_templates_user_id ON message_templates (user_id)"),
+    ("idx_notes_user_id", "CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes (user_id, id DESC)"),
+    ("idx_email_logs_deadline_id", "CREATE INDEX IF NOT EXISTS idx_email_logs_deadline_id ON email_logs (deadline_id)"),
+    ("idx_sms_logs_deadline_id", "CREATE INDEX IF NOT EXISTS idx_sms_logs_deadline_id ON sms_logs (deadline_id)"),
+    ("idx_users_pending", "CREATE INDEX IF NOT EXISTS idx_users_pending ON users (registered_at) WHERE approved = FALSE"),
+]
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(255) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL UNIQUE,
+            phone VARCHAR(20),
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            approved BOOLEAN DEFAULT FALSE,
+            approved_by VARCHAR(255),
+            approved_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS clients (
+            id SERIAL PRIMARY KEY,
+            user_id INT,
+            name VARCHAR(255) NOT NULL,
+            ice VARCHAR(255),
+            if_number VARCHAR(255),
+            email VARCHAR(255),
+            phone VARCHAR(255),
+            type VARCHAR(255),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE SET NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS deadlines (
+            id SERIAL PRIMARY KEY,
+            client_id INT,
+            type VARCHAR(255),
+            period VARCHAR(255),
+            due_date DATE,
+            status VARCHAR(255),
+            email_sent BOOLEAN DEFAULT FALSE,
+            sms_sent BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS notes (
+            id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS email_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INT,
+            deadline_id INT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sms_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INT,
+            deadline_id INT,
+            phone VARCHAR(20),
+            message TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS message_templates (
+            id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            email_message TEXT,
+            sms_message TEXT,
+            email_subject VARCHAR(255),
+            deadline_type VARCHAR(255),
+            client_id INT,
+            days_before INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE SET NULL
+        )
+        """
+    ]),
+    (2, "move sms_sent from users to deadlines", [
+        "ALTER TABLE users DROP COLUMN IF EXISTS sms_sent",
+        "ALTER TABLE deadlines ADD COLUMN IF NOT EXISTS sms_sent BOOLEAN DEFAULT FALSE",
+    ]),
+    (3, "message outbox", [
+        """
+        CREATE TABLE IF NOT EXISTS message_outbox (
+            id SERIAL PRIMARY KEY,
+            channel VARCHAR(10) NOT NULL,
+            user_id INT,
+            deadline_id INT,
+            recipient VARCHAR(255) NOT NULL,
+            subject VARCHAR(255),
+            body TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            last_error TEXT,
+            available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_message_outbox_pending
+        ON message_outbox (available_at, id) WHERE status = 'pending'
+        """
+    ]),
+    (4, "indexes for the hot query paths", [ddl for _, ddl in HOT_PATH_INDEXES]),
+    # Trigram index for the client name search of "View Deadlines"; skipped
+    # where the pg_trgm extension is not available or may not be created.
+    (5, "trigram index on clients.name", [
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (name gin_trgm_ops);
+            ELSE
+                RAISE NOTICE 'pg_trgm is not available, clients.name searches stay unindexed';
+            END IF;
+        EXCEPTION WHEN insufficient_privilege THEN
+            RAISE NOTICE 'not allowed to create pg_trgm, clients.name searches stay unindexed';
+        END
+        $$
+        """
+    ]),
+    (6, "client lookup by ICE for imports", [
+        "CREATE INDEX IF NOT EXISTS idx_clients_user_ice ON clients (user_id, ice)",
+    ]),
+    (7, "background export jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            format VARCHAR(10) NOT NULL,
+            horizon_months INT NOT NULL DEFAULT 0,
+            artifact_key VARCHAR(64) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            total_rows INT,
+            progress_rows INT NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            locked_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_pending ON export_jobs (id) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_user ON export_jobs (user_id, id)",
+    ]),
+    # One row per reminder actually delivered; planners skip what is already
+    # in it, so re-running a reminder job only sends what is missing.
+    (8, "reminder delivery ledger", [
+        """
+        CREATE TABLE IF NOT EXISTS delivery_ledger (
+            deadline_id INT NOT NULL,
+            occurrence_date DATE NOT NULL,
+            offset_days INT NOT NULL,
+            channel VARCHAR(10) NOT NULL,
+            user_id INT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT uq_delivery_ledger UNIQUE (deadline_id, occurrence_date, offset_days, channel),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(deadline_id) REFERENCES deadlines(id) ON DELETE CASCADE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_delivery_ledger_occurrence ON delivery_ledger (occurrence_date)",
+    ]),
+    # Part of the compiled template cache key (see template_engine.py)
+    (9, "message template revision timestamp", [
+        "ALTER TABLE message_templates ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+    ]),
+    # Any UPDATE, from the app or by hand, gets a new revision. clock_timestamp()
+    # rather than CURRENT_TIMESTAMP, which is fixed for the whole transaction.
+    (10, "bump message template revision on update", [
+        """
+        CREATE OR REPLACE FUNCTION touch_message_template() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_message_templates_updated_at ON message_templates",
+        """
+        CREATE TRIGGER trg_message_templates_updated_at
+        BEFORE UPDATE ON message_templates
+        FOR EACH ROW EXECUTE PROCEDURE touch_message_template()
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
@@ -0,0 +1,31 @@
+from psycopg2.extras import execute_values
+from database import get_connection
+
+# Outbox rows are sent by outbox_sender.py; the Streamlit pages only insert them.
+
+def enqueue_messages(messages, conn=None):
+    """Insert messages into message_outbox and return their ids.
+
+    Each message is a dict with channel ('email' or 'sms'), recipient and
+    body, plus optional subject, user_id and deadline_id. When conn is given
+    the rows are added to the caller's transaction and not committed here.
+    """
+    if not messages:
+        return []
+    rows = [
+        (m["channel"], m.get("user_id"), m.get("deadline_id"), m["recipient"], m.get("subject"), m["body"])
+        for m in messages
+    ]
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    c = conn.cursor()
+    ids = execute_values(c, """
+        INSERT INTO message_outbox (channel, user_id, deadline_id, recipient, subject, body)
+        VALUES %s
+        RETURNING id
+    """, rows, fetch=True)
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return [row[0] for row in ids]
@@ -0,0 +1,160 @@
+import argparse
+import os
+import time
+from psycopg2.extras import execute_values
+from database import get_connection
+from delivery_log import DeliveryRecorder
+import email_utils
+
+# Queued messages are sent by run(): in a thread of the Streamlit app (see
+# OUTBOX_SENDER_IN_APP in main.py), by a standalone `python outbox_sender.py`,
+# and by the daily workflow's `--once` pass, which drains anything left over.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Base delay before a failed message is retried, doubled on every attempt (seconds)
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "30"))
+# Rows left in 'sending' longer than this belong to a crashed sender (seconds)
+OUTBOX_LOCK_TIMEOUT = float(os.getenv("OUTBOX_LOCK_TIMEOUT", "600"))
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Lock up to batch_size due messages for this sender.
+
+    SKIP LOCKED lets several senders claim disjoint batches side by side.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        UPDATE message_outbox
+        SET status = 'pending', locked_at = NULL
+        WHERE status = 'sending' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    """, (OUTBOX_LOCK_TIMEOUT,))
+    c.execute("""
+        UPDATE message_outbox
+        SET status = 'sending', locked_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM message_outbox
+            WHERE status = 'pending' AND available_at <= CURRENT_TIMESTAMP
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, channel, user_id, deadline_id, recipient, subject, body, attempts
+    """, (batch_size,))
+    columns = [col[0] for col in c.description]
+    rows = [dict(zip(columns, row)) for row in c.fetchall()]
+    conn.commit()
+    conn.close()
+    return rows
+
+def _send_sms_batch(messages):
+    for msg in messages:
+        msg["to"], msg["message"] = msg["recipient"], msg["body"]
+    try:
+        import SMS_utils
+        return SMS_utils.dispatch_sms(messages)
+    except Exception as e:
+        # A setup failure fails the SMS rows only, so the batch's email results are still recorded
+        return [(msg, e) for msg in messages]
+
+def send_batch(rows):
+    emails = [row for row in rows if row["channel"] == "email"]
+    sms = [row for row in rows if row["channel"] == "sms"]
+    results = []
+    if emails:
+        for row in emails:
+            row["to"], row["message"] = row["recipient"], row["body"]
+        results += email_utils.dispatch_messages(emails)
+    if sms:
+        results += _send_sms_batch(sms)
+    return results
+
+def record_results(results):
+    """Write a batch's outcomes: one statement per kind of outcome, not per message.
+
+    The message_outbox statuses are committed first, in their own
+    transaction, so a failure writing the delivery logs cannot leave
+    delivered rows in 'sending' to be claimed and sent again.
+    """
+    sent, failed, retried = [], [], []
+    for msg, error in results:
+        if error is None:
+            sent.append(msg)
+            print(f"✅ Message {msg['id']} ({msg['channel']}) envoyé à {msg['recipient']}")
+        elif not getattr(error, "retryable", True):
+            # Sending again could deliver the message twice, or would be refused again
+            failed.append((msg["id"], str(error)))
+            print(f"❌ Message {msg['id']} abandonné, erreur définitive: {error}")
+        elif msg["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            failed.append((msg["id"], str(error)))
+            print(f"❌ Message {msg['id']} abandonné après {msg['attempts']} tentatives: {error}")
+        else:
+            delay = OUTBOX_RETRY_DELAY * 2 ** (msg["attempts"] - 1)
+            retried.append((msg["id"], str(error), delay))
+            print(f"⚠️ Message {msg['id']} en échec, nouvel essai dans {delay:.0f}s: {error}")
+
+    # Commits on success, rolls back on error, and returns the connection to the pool either way
+    with get_connection() as conn:
+        c = conn.cursor()
+        if sent:
+            c.execute("""
+                UPDATE message_outbox
+                SET status = 'sent', sent_at = CURRENT_TIMESTAMP, locked_at = NULL, last_error = NULL
+                WHERE id = ANY(%s)
+            """, ([msg["id"] for msg in sent],))
+        if failed:
+            execute_values(c, """
+                UPDATE message_outbox AS m
+                SET status = 'failed', locked_at = NULL, last_error = v.error
+                FROM (VALUES %s) AS v (id, error)
+                WHERE m.id = v.id
+            """, failed, page_size=len(failed))
+        if retried:
+            execute_values(c, """
+                UPDATE message_outbox AS m
+                SET status = 'pending', locked_at = NULL, last_error = v.error,
+                    available_at = CURRENT_TIMESTAMP + make_interval(secs => v.delay)
+                FROM (VALUES %s) AS v (id, error, delay)
+                WHERE m.id = v.id
+            """, retried, page_size=len(retried))
+
+    try:
+        with DeliveryRecorder(flush_size=max(1, len(sent))) as recorder:
+            for msg in sent:
+                if msg["deadline_id"] and msg["channel"] == "email":
+                    recorder.record_email(msg["user_id"], [msg["deadline_id"]])
+                elif msg["deadline_id"] and msg["channel"] == "sms":
+                    recorder.record_sms(msg["user_id"], [msg["deadline_id"]], msg["recipient"], msg["body"])
+    except Exception as e:
+        # The messages are delivered and marked sent; only their logs and flags are missing
+        print(f"⚠️ Journal d'envoi non écrit pour {len(sent)} message(s): {e}")
+
+def process_batch(batch_size=OUTBOX_BATCH_SIZE):
+    rows = claim_batch(batch_size)
+    if rows:
+        record_results(send_batch(rows))
+    return len(rows)
+
+def run(batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL, once=False):
+    print("🚀 Démarrage de l'expéditeur de la file de messages")
+    while True:
+        try:
+            if process_batch(batch_size):
+                continue
+        except Exception as e:
+            # Keep the in-app sender thread alive across database hiccups
+            if once:
+                raise
+            print(f"⚠️ Expéditeur de la file de messages: {e}")
+        if once:
+            break
+        time.sleep(poll_interval)
+    print("🏁 File de messages vidée")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send queued emails and SMS from message_outbox.")
+    parser.add_argument("--once", action="store_true", help="exit once the outbox has no due message")
+    parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+    parser.add_argument("--poll-interval", type=float, default=OUTBOX_POLL_INTERVAL)
+    args = parser.parse_args()
+    run(batch_size=args.batch_size, poll_interval=args.poll_interval, once=args.once)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Months between two occurrences of a recurring deadline, keyed by lower(period).
+# Any other period ('One Time') has a single occurrence on its due_date.
+PERIOD_MONTHS = {
+    "mensuel": 1,
+    "trimestriel": 3,
+    "annuel": 12,
+}
+
+def period_steps(periods):
+    """Months between occurrences for each period label, 0 for non-recurring ones."""
+    labels, codes = np.unique(np.asarray(periods, dtype=object).astype(str), return_inverse=True)
+    steps = np.array([PERIOD_MONTHS.get(label.lower(), 0) for label in labels], dtype=np.int64)
+    return steps[codes.reshape(-1)]
+
+def expand_occurrences(due_dates, periods, start, end):
+    """Expand deadline series into their occurrences between start and end (inclusive).
+
+    A series starts at its stored due_date (the next occurrence, as kept up to
+    date by rollover.py) and repeats every PERIOD_MONTHS[period] months on the
+    same day, clamped to the end of shorter months. Nothing is materialized in
+    the database and there is no Python loop per series or occurrence.
+
+    Returns (positions, dates): the index of the series in the inputs and the
+    datetime64[D] date of each occurrence, ordered by series then date.
+    """
+    due = np.asarray(due_dates)
+    if due.dtype.kind != "M":
+        due = pd.to_datetime(pd.Series(due, dtype="object")).to_numpy()
+    due = due.astype("datetime64[D]")
+    steps = period_steps(periods)
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    if not len(due) or end < start:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[D]")
+
+    due_month = due.astype("datetime64[M]")
+    day = (due - due_month.astype("datetime64[D]")).astype(np.int64)
+    first_month = due_month.astype(np.int64)
+    start_month = start.astype("datetime64[M]").astype(np.int64)
+    end_month = end.astype("datetime64[M]").astype(np.int64)
+
+    # Occurrence k falls in month first_month + k * step; keep k in [k_min, k_max]
+    recurring = steps > 0
+    safe_steps = np.where(recurring, steps, 1)
+    k_min = np.where(recurring, np.maximum(0, -((first_month - start_month) // safe_steps)), 0)
+    k_max = np.where(recurring, (end_month - first_month) // safe_steps, 0)
+    counts = np.maximum(0, k_max - k_min + 1)
+
+    positions = np.repeat(np.arange(len(due)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    k = k_min[positions] + offsets
+    months = (first_month[positions] + k * steps[positions]).astype("datetime64[M]")
+    month_start = months.astype("datetime64[D]")
+    month_end = (months + 1).astype("datetime64[D]") - 1
+    dates = np.minimum(month_start + day[positions], month_end)
+
+    keep = (dates >= start) & (dates <= end)
+    return positions[keep], dates[keep]
+
+def expand_frame(df, start, end, date_column="due_date", period_column="period", occurrence_column="occurrence_date"):
+    """Rows of df repeated once per occurrence in [start, end], with the occurrence date added."""
+    positions, dates = expand_occurrences(df[date_column].to_numpy(), df[period_column].to_numpy(), start, end)
+    expanded = df.iloc[positions].reset_index(drop=True)
+    expanded[occurrence_column] = pd.Series(dates).dt.date
+    return expanded
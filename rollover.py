@@ -0,0 +1,68 @@
+from datetime import datetime
+from database import get_connection, bump_data_version
+
+def roll_over_deadlines(today=None):
+    """Advance every recurring deadline due on or before today, in bulk.
+
+    Each recurring deadline jumps straight to its first occurrence after
+    today, so days the job did not run are caught up by the same statement.
+    Non-recurring ('One Time') deadlines that are due are deleted. Moved
+    rows get their email_sent / sms_sent flags cleared for the new
+    occurrence, and ledger rows of past occurrences are dropped. Returns
+    the number of rows moved per period and the number of deleted rows.
+    """
+    # recurrence pulls in numpy and pandas; keep them off the app's startup path
+    from recurrence import PERIOD_MONTHS
+    today = today or datetime.now().date()
+    params = {
+        "today": today,
+        "periods": list(PERIOD_MONTHS),
+        "steps": list(PERIOD_MONTHS.values()),
+    }
+    conn = get_connection()
+    c = conn.cursor()
+
+    # k = whole periods between the months of due_date and today; the next
+    # occurrence is due_date + k periods, or one period more if that is not after today.
+    c.execute("""
+        WITH overdue AS (
+            SELECT d.id, d.due_date, p.period, p.step,
+                   (((date_part('year', %(today)s::date) - date_part('year', d.due_date)) * 12
+                     + date_part('month', %(today)s::date) - date_part('month', d.due_date))::int / p.step) AS k
+            FROM deadlines d
+            JOIN unnest(%(periods)s::text[], %(steps)s::int[]) AS p(period, step) ON lower(d.period) = p.period
+            WHERE d.due_date <= %(today)s
+        ), moved AS (
+            UPDATE deadlines d
+            SET due_date = CASE
+                WHEN (o.due_date + make_interval(months => o.k * o.step))::date > %(today)s
+                    THEN (o.due_date + make_interval(months => o.k * o.step))::date
+                ELSE (o.due_date + make_interval(months => (o.k + 1) * o.step))::date
+            END,
+            email_sent = FALSE,
+            sms_sent = FALSE
+            FROM overdue o
+            WHERE d.id = o.id
+            RETURNING o.period
+        )
+        SELECT period, count(*) FROM moved GROUP BY period
+    """, params)
+    moved = dict(c.fetchall())
+
+    c.execute("""
+        WITH removed AS (
+            DELETE FROM deadlines
+            WHERE due_date <= %(today)s AND lower(period) <> ALL(%(periods)s::text[])
+            RETURNING 1
+        )
+        SELECT count(*) FROM removed
+    """, params)
+    deleted = c.fetchone()[0]
+
+    # The planners only look at upcoming occurrences
+    c.execute("DELETE FROM delivery_ledger WHERE occurrence_date < %(today)s", params)
+
+    conn.commit()
+    conn.close()
+    bump_data_version()
+    return {"moved": {period: moved.get(period, 0) for period in PERIOD_MONTHS}, "deleted": deleted}
@@ -1,4 +1,5 @@
 import streamlit as st
+from auth import clear_session_identity
 
 def render_sidebar_menu(menu_items, is_admin, cookies):
     st.markdown("""
@@ -48,8 +49,7 @@ def render_sidebar_menu(menu_items, is_admin, cookies):
         if st.sidebar.button("🔓 Logout"):
             cookies["auth_token"] = ""
             cookies.save()
-            keys_to_del = ["authentication_status", "is_admin", "name", "username", "feature"]
-            for key in keys_to_del:
-                if key in st.session_state:
-                    del st.session_state[key]
+            clear_session_identity()
+            if "feature" in st.session_state:
+                del st.session_state["feature"]
             st.rerun()
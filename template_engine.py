@@ -0,0 +1,130 @@
+import os
+import string
+import threading
+from collections import OrderedDict
+from datetime import date
+
+# Compiled templates kept in memory, least recently used evicted first
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "512"))
+
+# Variables a message template may use, in the order the customizer lists them
+TEMPLATE_VARIABLES = (
+    "client_name", "client_email", "client_phone", "client_type", "ice",
+    "if_number", "deadline_type", "period", "due_date", "status",
+)
+
+# Values used to check format specs such as {due_date:%d/%m/%Y} when compiling
+SAMPLE_VALUES = {
+    "client_name": "Client", "client_email": "client@example.ma", "client_phone": "+212600000000",
+    "client_type": "SARL", "ice": "000000000000000", "if_number": "0", "deadline_type": "TVA",
+    "period": "Mensuel", "due_date": date(2000, 1, 31), "status": "Pending",
+}
+
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+class TemplateError(ValueError):
+    pass
+
+def _field_formatter(conversion, format_spec):
+    convert = _CONVERSIONS[conversion] if conversion else None
+    if not format_spec:
+        return convert or str
+    if convert:
+        return lambda value: format(convert(value), format_spec)
+    return lambda value: format(value, format_spec)
+
+class CompiledTemplate:
+    """A message template parsed once into literal text and variable slots.
+
+    Same syntax and output as str.format with keyword arguments, limited to
+    TEMPLATE_VARIABLES; anything else raises TemplateError when compiling
+    rather than when sending.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        parts = []
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Modèle mal formé: {e}")
+        unknown = []
+        for literal, field_name, format_spec, conversion in parsed:
+            if field_name is None:
+                parts.append((literal, None, None))
+                continue
+            if field_name not in TEMPLATE_VARIABLES:
+                unknown.append("{" + field_name + "}")
+                continue
+            if format_spec and "{" in format_spec:
+                raise TemplateError(f"Format imbriqué non pris en charge: {{{field_name}:{format_spec}}}")
+            parts.append((literal, field_name, _field_formatter(conversion, format_spec)))
+        if unknown:
+            raise TemplateError(f"Variable(s) inconnue(s): {', '.join(unknown)}")
+        self._parts = tuple(parts)
+        self.variables = frozenset(name for _, name, _ in parts if name)
+        try:
+            self.render(SAMPLE_VALUES)
+        except (ValueError, TypeError) as e:
+            raise TemplateError(f"Format invalide: {e}")
+
+    def render(self, values):
+        """Render with values, a mapping holding at least the template's variables."""
+        out = []
+        for literal, name, formatter in self._parts:
+            out.append(literal)
+            if name is not None:
+                out.append(formatter(values[name]))
+        return "".join(out)
+
+def compile_template(text):
+    return CompiledTemplate(text)
+
+def validate_template(text):
+    """Error message for text, or None when it compiles."""
+    try:
+        CompiledTemplate(text)
+    except TemplateError as e:
+        return str(e)
+    return None
+
+class TemplateCache:
+    """LRU cache of compiled message_templates fields.
+
+    Entries are keyed by (template id, updated_at, field). A trigger moves
+    updated_at on every UPDATE of the row (migration 10), so a saved edit is
+    picked up on the next lookup without any explicit invalidation.
+    """
+
+    def __init__(self, max_size=TEMPLATE_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, template_id, updated_at, field, text):
+        key = (template_id, updated_at, field)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        compiled = CompiledTemplate(text)
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_cache = TemplateCache()
+
+def get_template(template_id, updated_at, field, text):
+    """Compiled form of one field of a message_templates row, from the shared cache."""
+    return _cache.get(template_id, updated_at, field, text)
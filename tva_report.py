@@ -0,0 +1,270 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+
+# Reports with more invoice lines than this are written in openpyxl's
+# write-only mode: rows are streamed to the file instead of kept as cells.
+TVA_REPORT_WRITE_ONLY_ROWS = int(os.getenv("TVA_REPORT_WRITE_ONLY_ROWS", "1000"))
+
+LINE_COLUMNS = ["Role", "Service", "TTC", "HT", "TVA Rate", "TVA"]
+ROLES = ["Client", "Fournisseur"]
+CREDIT_SERVICE = "Crédit Précédent"
+DEFAULT_TVA_RATE = 20.0
+# Header names accepted for pasted or uploaded lines, lowercased
+LINE_ALIASES = {
+    "role": "Role", "type": "Role",
+    "service": "Service", "service name": "Service", "libellé": "Service", "facture": "Service",
+    "ttc": "TTC", "mt ttc": "TTC", "total incl. vat": "TTC", "montant ttc": "TTC",
+    "tva rate": "TVA Rate", "taux": "TVA Rate", "taux tva": "TVA Rate", "vat rate %": "TVA Rate", "vat rate": "TVA Rate",
+}
+INPUT_COLUMNS = ["Role", "Service", "TTC", "TVA Rate"]
+
+ROW_HEIGHT = 22
+COLUMN_WIDTH = 18
+FIRST_COLUMN = 2
+LAST_COLUMN = 6
+DATA_COLUMNS = ["Service", "TTC", "HT", "TVA Rate", "TVA"]
+
+_BORDER = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+_CENTER = Alignment(horizontal="center")
+_CELL_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+
+def _fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+GREY_FILL = _fill("C0C0C0")
+GREEN_FILL = _fill("C6EFCE")
+RED_FILL = _fill("FFC7CE")
+YELLOW_FILL = _fill("FFEB9C")
+
+def _named_styles():
+    """The report's styles, built once per workbook and shared by every cell."""
+    def style(name, **attrs):
+        named = NamedStyle(name=name)
+        for attr, value in attrs.items():
+            setattr(named, attr, value)
+        return named
+
+    cell = {"font": Font(bold=True, size=12), "alignment": _CELL_ALIGNMENT, "border": _BORDER}
+    return [
+        style("tva_title", font=Font(bold=True, size=12), alignment=_CENTER),
+        style("tva_header", font=Font(bold=True), alignment=_CENTER, border=_BORDER),
+        style("tva_cell", **cell),
+        style("tva_cell_rate", fill=GREY_FILL, **cell),
+        style("tva_cell_credit", fill=RED_FILL, **cell),
+        style("tva_cell_invoice", fill=YELLOW_FILL, **cell),
+        style("tva_total_label", font=Font(bold=True), fill=GREEN_FILL, alignment=_CENTER),
+        style("tva_total", font=Font(bold=True), fill=GREEN_FILL),
+        style("tva_due_label", font=Font(bold=True, color="FF0000"), fill=RED_FILL, alignment=_CENTER),
+        style("tva_due", font=Font(bold=True)),
+    ]
+
+def _to_hundredths(values):
+    """Float amounts with at most two decimals as exact int64 hundredths."""
+    return np.rint(np.asarray(values, dtype=float) * 100).astype(np.int64)
+
+def compute_ht_tva(ttc, tva_rate):
+    """HT and TVA of every TTC amount at once, rounded half up to the cent.
+
+    Amounts and rates are converted to integer cents and hundredths of a
+    percent, so HT = TTC * 10000 / (10000 + rate) is divided exactly instead
+    of through binary floats. Lines with a missing TTC or rate get NaN.
+    """
+    ttc = np.asarray(ttc, dtype=float)
+    tva_rate = np.broadcast_to(np.asarray(tva_rate, dtype=float), ttc.shape)
+    valid = ~(np.isnan(ttc) | np.isnan(tva_rate))
+    ttc_cents = _to_hundredths(np.where(valid, ttc, 0))
+    denominator = 10_000 + _to_hundredths(np.where(valid, tva_rate, 0))
+    # Half up (away from zero): floor((2 * n + d) / 2d) on absolute values
+    numerator = np.abs(ttc_cents) * 10_000
+    ht_cents = np.sign(ttc_cents) * ((2 * numerator + denominator) // (2 * denominator))
+    tva_cents = ttc_cents - ht_cents
+    ht = np.where(valid, ht_cents / 100, np.nan)
+    tva = np.where(valid, tva_cents / 100, np.nan)
+    return ht, tva
+
+def parse_amounts(values):
+    """Numbers typed the French or English way ("1 234,50", "20%") as floats; NaN when unreadable."""
+    text = (values.astype(str).str.strip()
+            .str.replace("[\\s\u00a0\u202f%]", "", regex=True)
+            .str.replace(",", ".", regex=False))
+    return pd.to_numeric(text, errors="coerce").astype(float)
+
+def read_lines(data, filename=None):
+    """Read invoice lines pasted as text or uploaded as CSV/XLSX into a frame of strings.
+
+    Columns are taken from a header row when one is recognised (see
+    LINE_ALIASES), otherwise in the order Role, Service, TTC, TVA Rate.
+    Tab (pasted from a spreadsheet), ';' and ',' separators are accepted.
+    """
+    if filename and filename.lower().endswith((".xlsx", ".xlsm")):
+        df = pd.read_excel(data, dtype=str, header=None, keep_default_na=False)
+    else:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8-sig")
+        elif not isinstance(data, str):
+            data = data.read().decode("utf-8-sig")
+        if not data.strip():
+            return pd.DataFrame(columns=INPUT_COLUMNS)
+        first_line = data.lstrip().split("\n", 1)[0]
+        sep = max(["\t", ";", ","], key=first_line.count)
+        df = pd.read_csv(io.StringIO(data), dtype=str, header=None, keep_default_na=False,
+                         sep=sep, skip_blank_lines=True)
+    if df.empty:
+        return pd.DataFrame(columns=INPUT_COLUMNS)
+    header = [LINE_ALIASES.get(str(value).strip().lower()) for value in df.iloc[0]]
+    if "TTC" in header:
+        df = df.iloc[1:]
+        df.columns = [name or f"_{n}" for n, name in enumerate(header)]
+    else:
+        df = df.iloc[:, :len(INPUT_COLUMNS)]
+        df.columns = INPUT_COLUMNS[:df.shape[1]]
+    df = df.reindex(columns=INPUT_COLUMNS, fill_value="")
+    return df.apply(lambda col: col.astype(str).str.strip()).reset_index(drop=True)
+
+def prepare_lines(df, first_number=1):
+    """Turn read lines into LINE_COLUMNS with HT and TVA computed; returns (lines, errors).
+
+    Roles match case-insensitively, "Crédit Précédent" becomes the purchase
+    line of the previous credit, and an empty service is numbered from
+    first_number like lines added one by one. A missing rate defaults to
+    DEFAULT_TVA_RATE. errors lists rejected lines (1-based) with a reason.
+    """
+    role = df["Role"].str.strip().str.lower()
+    credit = role == CREDIT_SERVICE.lower()
+    roles = role.map({name.lower(): name for name in ROLES}).fillna("Client")
+    roles = roles.where(~credit, "Fournisseur")
+    ttc = parse_amounts(df["TTC"])
+    rate = parse_amounts(df["TVA Rate"].where(df["TVA Rate"] != "", str(DEFAULT_TVA_RATE)))
+
+    reasons = pd.Series("", index=df.index)
+    reasons = reasons.mask(~(role.isin([name.lower() for name in ROLES]) | credit | (role == "")), "unknown role")
+    reasons = reasons.mask(rate.isna() | (rate < 0) | (rate > 100), "VAT rate must be between 0 and 100")
+    reasons = reasons.mask(ttc.isna() | (ttc <= 0), "TTC must be a positive amount")
+    errors = pd.DataFrame({"line": df.index[reasons != ""] + 1, "error": reasons[reasons != ""]})
+
+    valid = reasons == ""
+    numbers = first_number + np.arange(len(df))
+    default_service = np.char.add(np.where(roles == "Fournisseur", "Facture ", "Service "), numbers.astype(str))
+    service = df["Service"].where(df["Service"] != "", pd.Series(default_service, index=df.index))
+    service = service.where(~credit, CREDIT_SERVICE)
+    ht, tva = compute_ht_tva(ttc, rate)
+    lines = pd.DataFrame({
+        "Role": roles, "Service": service, "TTC": ttc, "HT": ht, "TVA Rate": rate, "TVA": tva,
+    })[valid].reset_index(drop=True)
+    return lines, errors.reset_index(drop=True)
+
+class _SheetWriter:
+    """Appends styled rows from column B, in either workbook mode."""
+
+    def __init__(self, ws, write_only):
+        self.ws = ws
+        self.write_only = write_only
+        self.row = 0
+
+    def append(self, values, styles=None):
+        self.row += 1
+        if not values:
+            self.ws.append([])
+            return self.row
+        styles = styles if styles is not None else [None] * len(values)
+        if self.write_only:
+            cells = [None] * (FIRST_COLUMN - 1)
+            for value, style in zip(values, styles):
+                cell = WriteOnlyCell(self.ws, value=value)
+                if style:
+                    cell.style = style
+                cells.append(cell)
+            self.ws.append(cells)
+        else:
+            for column, (value, style) in enumerate(zip(values, styles), FIRST_COLUMN):
+                cell = self.ws.cell(row=self.row, column=column, value=value)
+                if style:
+                    cell.style = style
+        return self.row
+
+    def merge(self, row, first_column, last_column):
+        if self.write_only:
+            self.ws.merged_cells.add(f"{_letter(first_column)}{row}:{_letter(last_column)}{row}")
+        else:
+            self.ws.merge_cells(start_row=row, start_column=first_column, end_row=row, end_column=last_column)
+
+def _letter(column):
+    return chr(64 + column)
+
+def _row_styles(lines):
+    """Style names of every data cell, computed for the whole section at once."""
+    service = lines["Service"].astype(str)
+    credit = (service == "Crédit Précédent").to_numpy()
+    invoice = service.str.upper().str.startswith("FAC").to_numpy()
+    row_style = np.select([credit, invoice], ["tva_cell_credit", "tva_cell_invoice"], default="tva_cell")
+    rate_style = np.where(credit | invoice, row_style, "tva_cell_rate")
+    return np.column_stack([row_style, row_style, row_style, rate_style, row_style])
+
+def _write_section(writer, title, lines, first_col_header):
+    title_row = writer.append([title], ["tva_title"])
+    writer.merge(title_row, FIRST_COLUMN, LAST_COLUMN)
+    writer.append([first_col_header, "MT TTC", "M. H.T", "Taux TVA", "TVA"], ["tva_header"] * 5)
+
+    values = lines[DATA_COLUMNS].copy()
+    values["TVA Rate"] = values["TVA Rate"].astype(str) + "%"
+    for row_values, row_styles in zip(values.itertuples(index=False, name=None), _row_styles(lines).tolist()):
+        writer.append(list(row_values), row_styles)
+
+    tva_total = float(lines["TVA"].sum())
+    total_row = writer.append(["la somme de TVA", None, None, None, round(tva_total, 2)],
+                              ["tva_total_label", None, None, None, "tva_total"])
+    writer.merge(total_row, FIRST_COLUMN, LAST_COLUMN - 1)
+    return tva_total
+
+def write_tva_report(df, enterprise_name, date_str, out=None, write_only=None):
+    """Write the monthly TVA report of df (Role, Service, TTC, HT, TVA Rate, TVA) to out.
+
+    Sales come first, then purchases with the previous credit last, then the
+    TVA due. write_only defaults to True past TVA_REPORT_WRITE_ONLY_ROWS
+    lines. Returns out, a BytesIO by default, rewound.
+    """
+    if write_only is None:
+        write_only = len(df) > TVA_REPORT_WRITE_ONLY_ROWS
+    wb = Workbook(write_only=write_only)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    if write_only:
+        ws = wb.create_sheet("Rapport TVA")
+    else:
+        ws = wb.active
+        ws.title = "Rapport TVA"
+
+    # One default height instead of a row dimension per row
+    ws.sheet_format.defaultRowHeight = ROW_HEIGHT
+    ws.sheet_format.customHeight = True
+    for column in range(FIRST_COLUMN, LAST_COLUMN + 1):
+        ws.column_dimensions[_letter(column)].width = COLUMN_WIDTH
+
+    clients = df[df["Role"] == "Client"]
+    fournisseurs = df[df["Role"] == "Fournisseur"]
+    credit = fournisseurs["Service"] == "Crédit Précédent"
+    fournisseurs = pd.concat([fournisseurs[~credit], fournisseurs[credit]])
+
+    writer = _SheetWriter(ws, write_only)
+    writer.append([])
+    writer.append([])
+    tva_client = _write_section(writer, f"C.A du {date_str}  {enterprise_name}", clients, "Ventes")
+    writer.append(["Nombre de Facture", len(clients)], ["tva_total", "tva_total"])
+    writer.append([])
+
+    tva_fournisseur = _write_section(writer, f"TVA RECUPERABLE le {date_str}", fournisseurs, "Achats")
+    writer.append([])
+    writer.append([])
+    due_row = writer.append(["TVA DUE", None, None, None, round(tva_client - tva_fournisseur, 2)],
+                            ["tva_due_label", None, None, None, "tva_due"])
+    writer.merge(due_row, FIRST_COLUMN, LAST_COLUMN - 1)
+
+    out = out if out is not None else io.BytesIO()
+    wb.save(out)
+    out.seek(0)
+    return out